@@ -0,0 +1,460 @@
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import timeit
+import tracemalloc
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from openpyxl import Workbook, load_workbook
+
+import convert_to_json
+import keywords
+import process_sheet
+import readers
+import turn_export
+from keywords import EMOJI_REGEXP, normalise_automation, normalise_keyword
+
+WORDS = ["hi", "menu", "help", "baby", "mother", "clinic", "pregnant", "hiv", "test"]
+EMOJIS = ["👍", "👍🏿", "❤️", "🤰🏽", "👶", "🙏🏾", "1️⃣", "2️⃣"]
+
+
+def generate_workbook(
+    languages=30,
+    rows=150,
+    keywords=4,
+    emoji_density=0.2,
+    content_length=300,
+    numbers=2,
+    seed=0,
+):
+    """
+    Generates a workbook laid out like the content workbook, with an English master
+    and `languages` other language sheets of `rows` rows each. Each row has about
+    `content_length` characters of content, `keywords` keywords of its own, a fraction
+    `emoji_density` of them emoji, and the English keywords. Each sheet is imported to
+    `numbers` Turn numbers in ImportInfo.
+    """
+    rand = random.Random(seed)
+    workbook = Workbook()
+    workbook.active.title = "Language codes"
+    import_info = workbook.create_sheet("ImportInfo")
+    import_info.append(["Sheet", "Type", "Country", "Number"])
+
+    def row_keywords(code, number):
+        return [
+            (
+                rand.choice(EMOJIS)
+                if rand.random() < emoji_density
+                else f"{rand.choice(WORDS)}{number}{code}"
+            )
+            for _ in range(keywords)
+        ]
+
+    def content(i, title):
+        text = f"Content {i} in {title}, for South Africa."
+        while len(text) < content_length:
+            text += f" {rand.choice(WORDS)}"
+            if rand.random() < emoji_density / 4:
+                text += f" {rand.choice(EMOJIS)}"
+            if rand.random() < 0.05:
+                text += "\n\n"
+        return text
+
+    english_keywords = [row_keywords("", i) for i in range(rows)]
+    for language in range(languages + 1):
+        if language == 0:
+            title, code = "English master", "eng"
+        else:
+            title, code = f"Language {language} (Country)", f"l{language:02}"
+        sheet = workbook.create_sheet(title)
+        sheet.append(["Content title", "Content", "Language", "Automation"])
+        for i in range(rows):
+            words = row_keywords(code, i) if language else []
+            sheet.append(
+                [
+                    f"{code}_content_{i}",
+                    content(i, title),
+                    code,
+                    ", ".join(words + english_keywords[i]),
+                ]
+            )
+        for number in range(numbers):
+            import_info.append(
+                [title, "Client", f"Country {number}", f"=2700000000{number}"]
+            )
+    return workbook
+
+
+def generate_export(rows=150, media_density=0.3, seed=0):
+    """
+    Generates a Turn export of the English content, with media attached to a fraction
+    `media_density` of it
+    """
+    rand = random.Random(seed)
+    data = []
+    for i in range(rows):
+        media = rand.random() < media_density
+        data.append(
+            {
+                "question": f"eng_content_{i}",
+                "answer": f"Content {i}",
+                "attachment_media_object": {"id": f"media{i}"} if media else None,
+                "attachment_media_type": "image" if media else None,
+                "attachment_mime_type": "image/jpeg" if media else None,
+                "attachment_uri": f"https://example.org/{i}.jpg" if media else None,
+            }
+        )
+    return {"data": data, "schema_version": "0.1"}
+
+
+def legacy_normalise_automation(value):
+    """
+    The keyword normalisation that process_sheet used to do, for comparison
+    """
+    modifiers = ["\U0001f3fb", "\U0001f3fc", "\U0001f3fd", "\U0001f3fe", "\U0001f3ff"]
+    if value is None:
+        value = ""
+    elif isinstance(value, float):
+        value = str(int(value))
+    elif isinstance(value, int):
+        value = str(value)
+    keywords = [k.strip() for k in value.split(",")]
+    keywords = [k for k in keywords if k]
+    normalised = []
+    for keyword in keywords:
+        if EMOJI_REGEXP.match(keyword):
+            for m in modifiers:
+                keyword = keyword.replace(m, "")
+        normalised.append(keyword)
+    invalid = []
+    for keyword in normalised:
+        keyword = keyword.replace("\ufe0f", "")
+        keyword = keyword.replace("\ufe0e", "")
+        match = EMOJI_REGEXP.match(keyword)
+        if match and len(match[0]) < len(keyword):
+            invalid.append(keyword)
+    deduped = []
+    for keyword in normalised:
+        if keyword not in deduped:
+            deduped.append(keyword)
+    return tuple(deduped), tuple(invalid)
+
+
+def benchmark_keywords(workbook, repeat=3):
+    """
+    Times normalising every automation cell in the workbook, with the legacy and the
+    current normaliser. Returns the best time in seconds for each.
+    """
+    cells = [
+        row[3]
+        for sheet in workbook
+        if sheet.title not in ("Language codes", "ImportInfo")
+        for row in sheet.iter_rows(min_row=2, values_only=True)
+    ]
+
+    def current():
+        normalise_keyword.cache_clear()
+        normalise_automation.cache_clear()
+        for cell in cells:
+            normalise_automation(cell)
+
+    def legacy():
+        for cell in cells:
+            legacy_normalise_automation(cell)
+
+    assert [legacy_normalise_automation(c) for c in cells] == [
+        normalise_automation(c) for c in cells
+    ]
+    return {
+        "cells": len(cells),
+        "legacy": min(timeit.repeat(legacy, number=1, repeat=repeat)),
+        "current": min(timeit.repeat(current, number=1, repeat=repeat)),
+    }
+
+
+def measure(func, setup=None, repeat=3):
+    """
+    Times `func`, which returns the number of rows it processed, taking the best of
+    `repeat` runs, and measures its peak memory allocations with tracemalloc in a
+    separate run, so that tracing doesn't affect the times. `setup` returns the
+    arguments for each run, and isn't timed.
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        rows = func(*args)
+        times.append(time.perf_counter() - start)
+    args = setup() if setup else ()
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    seconds = min(times)
+    return {
+        "seconds": seconds,
+        "rows": rows,
+        "rows_per_second": rows / seconds if seconds else None,
+        "peak_memory": peak,
+    }
+
+
+def sheet_values(workbook):
+    """
+    Returns the header and rows of values for each content sheet of `workbook`
+    """
+    values = {}
+    for sheet in workbook:
+        if sheet.title.strip().lower() in process_sheet.SKIP_SHEETS:
+            continue
+        rows = [list(row) for row in sheet.iter_rows(values_only=True)]
+        values[sheet.title] = (rows[0], rows[1:])
+    return values
+
+
+def run_rules(values, rules):
+    """
+    Applies the `rules` to the sheet `values`, like `process_sheet.apply_rules` does,
+    without the openpyxl cells
+    """
+    english = None
+    count = 0
+    output = io.StringIO()
+    titles = sorted(values, key=lambda t: t != process_sheet.ENGLISH_MASTER)
+    with redirect_stdout(output):
+        for title in titles:
+            header, rows = values[title]
+            sheet_rules = [r for r in rules if title.strip().lower() not in r.skip]
+            lookups = {lookup for r in sheet_rules for lookup in r.english}
+            if english is None and lookups:
+                english_header, english_rows = values[process_sheet.ENGLISH_MASTER]
+                english = process_sheet.get_english_index(
+                    process_sheet.ColumnMap(english_header), english_rows, lookups
+                )
+            columns = process_sheet.ColumnMap(header, title)
+            for _ in process_sheet.process_rows(columns, rows, sheet_rules, english):
+                count += 1
+    return count
+
+
+class ExportHandler(BaseHTTPRequestHandler):
+    """
+    A local stand in for the Turn export API, that serves the generated export
+    """
+
+    def do_GET(self):
+        body = self.server.export
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_benchmarks(path, export, repeat=3):
+    """
+    Runs all of the benchmarks against the workbook at `path`, and the Turn `export`.
+    Returns the results by benchmark name.
+    """
+    results = {}
+    workbook = load_workbook(path)
+    rows = sum(sheet.max_row for sheet in workbook)
+
+    def count_rows(wb):
+        return sum(1 for sheet in wb for _ in sheet.iter_rows(values_only=True))
+
+    def load():
+        load_workbook(path)
+        return rows
+
+    results["load openpyxl"] = measure(load, None, 1)
+    for reader in ("openpyxl", "xlsx"):
+        results[f"read {reader}"] = measure(
+            lambda: count_rows(readers.open_workbook(path, reader)), None, repeat
+        )
+
+    values = sheet_values(workbook)
+
+    def copy_values():
+        # Each run starts with the original values, and without any cached keywords
+        keywords.normalise_keyword.cache_clear()
+        keywords.normalise_automation.cache_clear()
+        return ({t: (h, [list(r) for r in rs]) for t, (h, rs) in values.items()},)
+
+    for rule in process_sheet.RULES:
+        results[f"rule {rule.__name__}"] = measure(
+            lambda v: run_rules(v, [rule]), copy_values, repeat
+        )
+    results["rules all"] = measure(
+        lambda v: run_rules(v, process_sheet.RULES), copy_values, repeat
+    )
+
+    def apply_rules(wb):
+        with redirect_stdout(io.StringIO()):
+            process_sheet.apply_rules(wb)
+        return rows
+
+    results["apply_rules"] = measure(
+        apply_rules, lambda: (load_workbook(path),), min(repeat, 2)
+    )
+
+    server = HTTPServer(("127.0.0.1", 0), ExportHandler)
+    server.export = json.dumps(export).encode()
+    threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/v1/export"
+    with tempfile.TemporaryDirectory() as directory:
+
+        def get_media():
+            # Like convert_to_json.get_media, which always uses the real export
+            entries = turn_export.get_media_entries(
+                "token", url=url, cache_directory=directory, ttl=0
+            )
+            return {convert_to_json.strip_language(e["question"]): e for e in entries}
+
+        results["get_media"] = measure(
+            lambda: get_media() and len(export["data"]), None, repeat
+        )
+        media = get_media()
+    server.shutdown()
+    server.server_close()
+
+    sheets, all_languages, _ = convert_to_json.get_import_info(workbook)
+    content_sheets = {values["sheet_name"] for values in sheets.values()}
+
+    def parse_sheets():
+        return {
+            title: convert_to_json.parse_sheet(workbook[title])
+            for title in content_sheets
+        }
+
+    results["automators"] = measure(
+        lambda: sum(len(r) for r in parse_sheets().values()), None, repeat
+    )
+    parsed = parse_sheets()
+
+    def write_json(compact):
+        count = 0
+        with tempfile.TemporaryDirectory() as directory:
+            writer = convert_to_json.ContentWriter(
+                os.path.join(directory, "content.json"), compact
+            )
+            for values in sheets.values():
+                languages = all_languages[values["country_name"]]
+                for entry in convert_to_json.get_entries(
+                    parsed[values["sheet_name"]], values, languages, media
+                ):
+                    writer.write(entry)
+                    count += 1
+            writer.close()
+        return count
+
+    results["write json"] = measure(lambda: write_json(False), None, repeat)
+    results["write json compact"] = measure(lambda: write_json(True), None, repeat)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """
+    Prints the change in time and memory of each benchmark against the `baseline`
+    results
+    """
+    print(f"Compared to {baseline['meta'].get('commit')}:")
+    for name, result in results["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        print(
+            f"  {name:32} {old['seconds'] / result['seconds']:6.2f}x speed, "
+            f"{result['peak_memory'] / max(old['peak_memory'], 1):6.2f}x memory"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the content scripts")
+    parser.add_argument("--languages", type=int, default=30)
+    parser.add_argument("--rows", type=int, default=150)
+    parser.add_argument("--keywords", type=int, default=4)
+    parser.add_argument("--emoji-density", type=float, default=0.2)
+    parser.add_argument("--content-length", type=int, default=300)
+    parser.add_argument(
+        "--numbers", type=int, default=2, help="Turn numbers for each sheet"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument(
+        "--compare", help="Compare the results to this earlier JSON results file"
+    )
+    args = parser.parse_args()
+
+    parameters = {
+        "languages": args.languages,
+        "rows": args.rows,
+        "keywords": args.keywords,
+        "emoji_density": args.emoji_density,
+        "content_length": args.content_length,
+        "numbers": args.numbers,
+    }
+    workbook = generate_workbook(**parameters)
+    export = generate_export(args.rows)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "who_content.xlsx")
+        workbook.save(path)
+        results = run_benchmarks(path, export, args.repeat)
+    keyword_result = benchmark_keywords(workbook, args.repeat)
+
+    print(f"{'Benchmark':32} {'Seconds':>8} {'Rows':>8} {'Rows/s':>10} {'Peak MB':>8}")
+    for name, result in results.items():
+        print(
+            f"{name:32} {result['seconds']:8.3f} {result['rows']:8} "
+            f"{result['rows_per_second']:10.0f} {result['peak_memory'] / 1e6:8.1f}"
+        )
+    print(f"Automation cells:  {keyword_result['cells']}")
+    print(f"Legacy keywords:   {keyword_result['legacy']:.3f}s")
+    print(f"Current keywords:  {keyword_result['current']:.3f}s")
+    speedup = keyword_result["legacy"] / keyword_result["current"]
+    print(f"Speedup:           {speedup:.1f}x")
+
+    output = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        },
+        "parameters": parameters,
+        "results": results,
+        "keywords": keyword_result,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=4)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(output, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+
+PROTOCOL = 4
+
+
+def cache_path(filename):
+    """
+    Returns the path of the build cache for the workbook `filename`, next to it
+    """
+    directory, name = os.path.split(filename.rstrip(os.sep))
+    return os.path.join(directory, f".{name}.cache.sqlite")
+
+
+def source_digest(*modules):
+    """
+    Returns a digest of the source of `modules`, so that cached results are only used
+    with the same code that built them
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class MemoryCache:
+    """
+    Cached results, by a key that's a hash of their inputs and `version`. Keeps track
+    of the results that were used and added, so that they can be saved afterwards, and
+    how many lookups hit and missed.
+    """
+
+    def __init__(self, entries=None, version=""):
+        self.entries = entries or {}
+        self.version = version
+        self.added = {}
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *inputs):
+        data = pickle.dumps((self.version, inputs), protocol=PROTOCOL)
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the result for `key`, or None if there isn't one
+        """
+        value = self.added.get(key, self.entries.get(key))
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.used.add(key)
+        return pickle.loads(value)
+
+    def put(self, key, value):
+        self.added[key] = pickle.dumps(value, protocol=PROTOCOL)
+        self.used.add(key)
+
+    def results(self):
+        """
+        Returns what this cache added and used, and its lookups, to merge into another
+        """
+        return {
+            "added": self.added,
+            "used": self.used,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def merge(self, added, used, hits=0, misses=0):
+        """
+        Adds the results that another cache, eg. in a worker process, added and used
+        """
+        self.added.update(added)
+        self.used.update(used)
+        self.hits += hits
+        self.misses += misses
+
+    def prune(self, keep):
+        """
+        Removes all the results except for the `keep` keys, and starts tracking the
+        results that are used again. For a cache that is kept in memory between runs,
+        so that results from earlier runs don't pile up.
+        """
+        results = {**self.entries, **self.added}
+        self.entries = {key: results[key] for key in keep if key in results}
+        self.added = {}
+        self.used = set()
+
+
+class BuildCache(MemoryCache):
+    """
+    A MemoryCache that is loaded from, and saved to, the `namespace` of a SQLite file
+    """
+
+    def __init__(self, path, namespace, version=""):
+        self.path = path
+        self.namespace = namespace
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(namespace TEXT, key TEXT, value BLOB, PRIMARY KEY (namespace, key))"
+        )
+        entries = dict(
+            self.connection.execute(
+                "SELECT key, value FROM cache WHERE namespace = ?", (namespace,)
+            )
+        )
+        super().__init__(entries, version)
+
+    def save(self, prune=True):
+        """
+        Saves the added results. If `prune` is set, results that weren't used in this
+        run are removed, so that the cache doesn't grow with every change.
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                ((self.namespace, k, v) for k, v in self.added.items()),
+            )
+            if prune:
+                self.connection.executemany(
+                    "DELETE FROM cache WHERE namespace = ? AND key = ?",
+                    ((self.namespace, k) for k in self.entries if k not in self.used),
+                )
+        self.entries.update(self.added)
+        self.added = {}
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,174 @@
+import json
+import os
+import sqlite3
+
+
+def store_path(filename):
+    """
+    Returns the path of the content store for the workbook, or CSV bundle directory,
+    `filename`, next to it
+    """
+    return f"{os.path.splitext(filename.rstrip(os.sep))[0]}.store.sqlite"
+
+
+def source_stamp(filename):
+    """
+    Returns the size and modification time of `filename`, or of each of the files in
+    it if it's a directory, to check that a store was written from the current version
+    of it
+    """
+    if os.path.isdir(filename):
+        return ",".join(
+            f"{name}:{source_stamp(os.path.join(filename, name))}"
+            for name in sorted(os.listdir(filename))
+        )
+    stat = os.stat(filename)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class StoreWriter:
+    """
+    Writes the rows of values of each sheet of a workbook to a SQLite content store,
+    along with a stamp of the workbook that they were read from. Rows can be appended
+    to the sheets in any order, like an openpyxl write only workbook.
+
+    The store is written to a temporary file, and only moved to `path` on `close`, so
+    that an incomplete store is never read.
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        if os.path.exists(f"{path}.tmp"):
+            os.remove(f"{path}.tmp")
+        self.connection = sqlite3.connect(f"{path}.tmp")
+        self.connection.executescript("""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE sheets (position INTEGER PRIMARY KEY, title TEXT UNIQUE);
+            CREATE TABLE rows (
+                sheet INTEGER, number INTEGER, "values" TEXT,
+                PRIMARY KEY (sheet, number)
+            );
+            """)
+        self.connection.execute(
+            "INSERT INTO meta VALUES ('source', ?)", (source_stamp(source),)
+        )
+        self.sheets = {}
+
+    def create_sheet(self, title):
+        position = len(self.sheets)
+        self.sheets[title] = [position, 0]
+        self.connection.execute("INSERT INTO sheets VALUES (?, ?)", (position, title))
+
+    def append(self, title, row):
+        sheet = self.sheets[title]
+        sheet[1] += 1
+        self.connection.execute(
+            "INSERT INTO rows VALUES (?, ?, ?)",
+            (sheet[0], sheet[1], json.dumps(list(row), default=str)),
+        )
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def discard(self):
+        self.connection.close()
+        os.remove(f"{self.path}.tmp")
+
+
+def write_store(path, source, workbook):
+    """
+    Writes the values of all the sheets of `workbook` to the content store at `path`
+    """
+    writer = StoreWriter(path, source)
+    try:
+        for sheet in workbook:
+            writer.create_sheet(sheet.title)
+            for row in sheet.iter_rows(values_only=True):
+                writer.append(sheet.title, row)
+    except BaseException:
+        writer.discard()
+        raise
+    writer.close()
+
+
+class StoreSheet:
+    """
+    A sheet of a content store, that can be read like an openpyxl worksheet, with
+    `iter_rows(values_only=True)`
+    """
+
+    def __init__(self, store, position, title):
+        self.store = store
+        self.position = position
+        self.title = title
+
+    def iter_rows(self, min_row=1, max_col=None, values_only=True):
+        if not values_only:
+            raise ValueError("The content store only has values")
+        rows = [
+            json.loads(values)
+            for values, in self.store.connection.execute(
+                'SELECT "values" FROM rows WHERE sheet = ? AND number >= ? '
+                "ORDER BY number",
+                (self.position, min_row),
+            )
+        ]
+        width = max_col or max((len(row) for row in rows), default=0)
+        for row in rows:
+            yield tuple(row[:width]) + (None,) * (width - len(row))
+
+
+class ContentStore:
+    """
+    Reads the sheets of a content store written by `StoreWriter`
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self.sheets = {
+            title: StoreSheet(self, position, title)
+            for position, title in self.connection.execute(
+                "SELECT position, title FROM sheets ORDER BY position"
+            )
+        }
+
+    @property
+    def sheetnames(self):
+        return list(self.sheets)
+
+    def __iter__(self):
+        return iter(self.sheets.values())
+
+    def __getitem__(self, title):
+        if title not in self.sheets:
+            raise KeyError(f"Worksheet {title} does not exist.")
+        return self.sheets[title]
+
+    def is_current(self, source):
+        """
+        Returns whether the store was written from the current version of `source`
+        """
+        (stamp,) = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'source'"
+        ).fetchone()
+        return stamp == source_stamp(source)
+
+    def close(self):
+        self.connection.close()
+
+
+def open_store(filename):
+    """
+    Returns the content store for the workbook `filename`, if there is one that was
+    written from its current version, otherwise None
+    """
+    path = store_path(filename)
+    if not os.path.exists(path):
+        return None
+    store = ContentStore(path)
+    if not store.is_current(filename):
+        store.close()
+        return None
+    return store
@@ -1,72 +1,92 @@
-
-from openpyxl import load_workbook
+import argparse
 import json
-import requests
 import os
+import re
+import sys
+
+import build_cache
+import content_store
+import keywords
+import readers
+import simulate
+import turn_diff
+import turn_export
+import turn_import
+from english_master import strip_language
+from keywords import clean_keyword
+from profiling import add_profile_arguments, profile_run, profiler
+
 FILENAME = "who_content.xlsx"
 SHEETNAME = "ImportInfo"
+# ImportInfo columns with a header of `replace:<placeholder>` replace the placeholder
+# in the content with the column's value for that row
+PLACEHOLDER_PREFIX = "replace:"
 ZAMBIA_TOKEN = os.environ.get("ZAMBIA_TEAM_TOKEN")
 
 
-def strip_language(keyword):
-    return keyword.split("_", 1)[-1]
-
-def get_media():
-    response = requests.get(
-        "https://whatsapp.turn.io/v1/export",
-        headers={
-            "Authorization": f"Bearer {ZAMBIA_TOKEN}",
-            "Accept": "application/vnd.v1+json"
-        }
-    )
-    response.raise_for_status()
+def get_media(offline=False, ttl=turn_export.CACHE_TTL):
+    """
+    Returns the content with media attached on the Zambia team line, by content name.
+    See `turn_export.get_media_entries` for how the export is cached.
+    """
     media = {}
-    for content in response.json()["data"]:
-        if content["attachment_media_object"]:
-            media[strip_language(content["question"])] = content
+    for content in turn_export.get_media_entries(
+        ZAMBIA_TOKEN, ttl=ttl, offline=offline
+    ):
+        media[strip_language(content["question"])] = content
     return media
 
-media = get_media()
-
-wb = load_workbook(FILENAME)
-ws = wb[SHEETNAME]
-sheets = {}
-all_languages = {}
-uniq_languages = []
-for row in ws.iter_rows(max_col=5):
-    if row[1].value and str(row[0].value).lower() != "sheet":
-        name = str(row[0].value).replace(" ", "_").replace("(", "").replace(")", "")
-        sheets[f"{row[2].value}_{name}_{row[1].value}"] = {
-            "sheet_name": row[0].value,
-            "number_type": row[1].value,
-            "country_name": row[2].value,
-            "replace": {
-                "South Africa": str(row[2].value),
-                "SOUTH AFRICA": str(row[2].value).upper(),
-                "Mozambique": str(row[2].value),
-                "MOZAMBIQUE": str(row[2].value).upper(),
-                "27600109000": str(row[3].value).replace("=", ""),
-            },
-        }
-        language = str(row[0].value).split(" (")[0]
-        if row[2].value not in all_languages:
-            all_languages[row[2].value] = []
-        if language not in all_languages[row[2].value]:
-            all_languages[row[2].value].append(language)
-        if language not in uniq_languages:
-            uniq_languages.append(language)
-# print(json.dumps(all_languages, indent=4))
-def clean_keyword(word):
-    word = word.strip()
-    try:
-        word = int(float(word))
-    except:
-        pass
-    return str(word)
+
+def get_import_info(wb):
+    """
+    Returns the sheets to import from the ImportInfo sheet, the languages for each
+    country, and the list of unique languages
+    """
+    ws = wb[SHEETNAME]
+    sheets = {}
+    all_languages = {}
+    uniq_languages = []
+    placeholders = {}
+    for row in ws.iter_rows(values_only=True):
+        if str(row[0]).lower() == "sheet":
+            placeholders = {
+                i: str(value).strip()[len(PLACEHOLDER_PREFIX) :].strip()
+                for i, value in enumerate(row)
+                if str(value).strip().lower().startswith(PLACEHOLDER_PREFIX)
+            }
+        elif row[1]:
+            name = str(row[0]).replace(" ", "_").replace("(", "").replace(")", "")
+            replace = {
+                "South Africa": str(row[2]),
+                "SOUTH AFRICA": str(row[2]).upper(),
+                "Mozambique": str(row[2]),
+                "MOZAMBIQUE": str(row[2]).upper(),
+                "27600109000": str(row[3]).replace("=", ""),
+            }
+            for i, placeholder in placeholders.items():
+                if i < len(row) and row[i] is not None:
+                    replace[placeholder] = str(row[i])
+            sheets[f"{row[2]}_{name}_{row[1]}"] = {
+                "sheet_name": row[0],
+                "number_type": row[1],
+                "country_name": row[2],
+                "replace": replace,
+                "replacer": compile_replacer(replace),
+            }
+            language = str(row[0]).split(" (")[0]
+            if row[2] not in all_languages:
+                all_languages[row[2]] = []
+            if language not in all_languages[row[2]]:
+                all_languages[row[2]].append(language)
+            if language not in uniq_languages:
+                uniq_languages.append(language)
+    return sheets, all_languages, uniq_languages
+
+
 def process_automators(keywords, language):
     triggers = []
     if keywords:
-        keywords = [clean_keyword(keyword) for keyword in str(keywords).split(",")]
+        keywords = [clean_keyword(k) for k in str(keywords).split(",")]
         language_match = None
         if language != "no-lang":
             language_match = language.upper()
@@ -109,10 +129,12 @@ def process_automators(keywords, language):
         return triggers
     else:
         return []
+
+
 def process_language_automations(keywords, language):
     automation = None
     if keywords:
-        keywords = [clean_keyword(keyword) for keyword in str(keywords).split(",")]
+        keywords = [clean_keyword(k) for k in str(keywords).split(",")]
         if len(keywords) == 1:
             params = {"exact_match": keywords[0]}
         else:
@@ -145,36 +167,91 @@ def process_language_automations(keywords, language):
             "name": f"{language}-language-switch",
         }
     return automation
+
+
+def compile_replacer(replace):
+    """
+    Returns a function that replaces all the keys of `replace` in the content with
+    their values, in a single pass over the content, with one regex that matches any of
+    the keys. Where keys overlap, the longest one is replaced.
+    """
+    replace = {k: v for k, v in replace.items() if k}
+    if not replace:
+        return lambda content: content
+    pattern = re.compile(
+        "|".join(re.escape(k) for k in sorted(replace, key=len, reverse=True))
+    )
+
+    def replacer(content):
+        return pattern.sub(lambda match: replace[match.group(0)], content)
+
+    return replacer
+
+
 def replace_content_values(content, values):
-    for from_value, to_value in values["replace"].items():
-        content = content.replace(from_value, to_value)
-    return content
+    replacer = values.get("replacer") or compile_replacer(values["replace"])
+    return replacer(content)
+
+
 def replace_content_languages(content_name, content, languages):
     if content_name == "eng_language":
         parts = content.split("\n\n")
         languages = "\n".join(languages)
         return "\n\n".join([parts[0], parts[1], languages, parts[3]])
     return content
-content_count = 0
-automation_count = 0
-number_data = {}
-for key, values in sheets.items():
-    sheet_name = values["sheet_name"]
-    country_name = values["country_name"]
-    number_type = values["number_type"]
-    number_desc = f"content_{country_name}_{number_type}.json"
-    if number_desc not in number_data:
-        number_data[number_desc] = []
-    print(f"processing: {key}")
-    ws = wb[sheet_name]
-    for row in ws.iter_rows(min_row=2, max_col=6):
-        if row[1].value:
-            question = row[0].value
-            content = row[1].value
-            language = row[2].value
-            automation_triggers = process_automators(row[3].value, language)
-            language_automation = process_language_automations(row[4].value, language)
-            automators = []
+
+
+def parse_sheet(ws, cache=None):
+    """
+    Returns a record of the question, content, language and automators for each
+    content row of the sheet `ws`. None of these depend on the Turn number that the
+    content is for, so each sheet only needs to be parsed once. If there is a build
+    `cache`, the records for rows that haven't changed are taken from it.
+    """
+    records = []
+    for row in ws.iter_rows(min_row=2, max_col=6, values_only=True):
+        if not row[1]:
+            continue
+        if cache is None:
+            records.append(parse_row(row))
+            continue
+        key = cache.key(row)
+        record = cache.get(key)
+        if record is None:
+            record = parse_row(row)
+            cache.put(key, record)
+        records.append(record)
+    return records
+
+
+def parse_row(row):
+    """
+    Returns the record of the question, content, language and automators for the
+    content `row` of values
+    """
+    question = row[0]
+    language = row[2]
+    automation_triggers = process_automators(row[3], language)
+    language_automation = process_language_automations(row[4], language)
+    automators = []
+    if automation_triggers:
+        automators.append(
+            {
+                "config": {
+                    "data": {
+                        "actions": [{"action_type": "reply"}],
+                        "operator": "AND",
+                        "triggers": automation_triggers,
+                    },
+                    "version": "0.2.0",
+                },
+                "enabled": True,
+                "is_deleted": False,
+                "name": question.replace("_", "-"),
+            }
+        )
+        if language == "eng":
+            automation_triggers = process_automators(row[3], "no-lang")
             if automation_triggers:
                 automators.append(
                     {
@@ -188,55 +265,304 @@ for key, values in sheets.items():
                         },
                         "enabled": True,
                         "is_deleted": False,
-                        "name": question.replace("_", "-"),
+                        "name": question.replace("_", "-").replace(
+                            "eng", "null-language"
+                        ),
                     }
                 )
-                if language == "eng":
-                    automation_triggers = process_automators(row[3].value, "no-lang")
-                    if automation_triggers:
-                        automators.append(
-                            {
-                                "config": {
-                                    "data": {
-                                        "actions": [{"action_type": "reply"}],
-                                        "operator": "AND",
-                                        "triggers": automation_triggers,
-                                    },
-                                    "version": "0.2.0",
-                                },
-                                "enabled": True,
-                                "is_deleted": False,
-                                "name": question.replace("_", "-").replace("eng", "null-language"),
-                            }
-                        )
-            if language_automation:
-                automators.append(language_automation)
-            content = replace_content_values(content, values)
-            content = replace_content_languages(question, content, all_languages[country_name])
-            media_content = media.get(strip_language(question), {})
-            number_data[number_desc].append(
-                {
-                    "answer": content,
-                    "attachment_media_object": media_content.get("attachment_media_object"),
-                    "attachment_media_type": media_content.get("attachment_media_type"),
-                    "attachment_mime_type": media_content.get("attachment_mime_type"),
-                    "attachment_uri": media_content.get("attachment_uri"),
-                    "automators": automators,
-                    "is_deleted": False,
-                    "language": language,
-                    "question": question,
-                }
-            )
-            content_count += 1
-            automation_count += len(automators)
-for output_file, data in number_data.items():
-    output = {"data": data, "schema_version": "0.1"}
-    with open(output_file.replace(" ", "_"), "w") as outfile:
-        json.dump(output, outfile, indent=4)
-print("done")
-print("")
-print(f"Turn Numbers:  {len(number_data.keys())}")
-print(f"Languages:     {len(uniq_languages)}")
-print(f"Sheets:        {len(sheets.keys())}")
-print(f"Content:       {content_count}")
-print(f"Automators:    {automation_count}")
+    if language_automation:
+        automators.append(language_automation)
+    return {
+        "question": question,
+        "content": row[1],
+        "language": language,
+        "automators": automators,
+    }
+
+
+def get_entries(records, values, languages, media):
+    """
+    Yields the Turn import entries for the parsed sheet `records`, for the ImportInfo
+    `values`. Only the content differs between Turn numbers.
+    """
+    for record in records:
+        question = record["question"]
+        content = replace_content_values(record["content"], values)
+        content = replace_content_languages(question, content, languages)
+        media_content = media.get(strip_language(question), {})
+        yield {
+            "answer": content,
+            "attachment_media_object": media_content.get("attachment_media_object"),
+            "attachment_media_type": media_content.get("attachment_media_type"),
+            "attachment_mime_type": media_content.get("attachment_mime_type"),
+            "attachment_uri": media_content.get("attachment_uri"),
+            "automators": record["automators"],
+            "is_deleted": False,
+            "language": record["language"],
+            "question": question,
+        }
+
+
+class ContentWriter:
+    """
+    Writes the `{"data": [...], "schema_version": "0.1"}` import file one entry at a
+    time, so that we don't have to keep all the entries in memory. The output is the
+    same as `json.dump(output, outfile, indent=4)`, or if `compact` is set, has no
+    indentation or whitespace.
+
+    The file is written to a temporary file, and only moved to `filename` on `close`,
+    so that a failed run doesn't leave incomplete files behind.
+    """
+
+    def __init__(self, filename, compact=False):
+        self.filename = filename
+        self.compact = compact
+        self.count = 0
+        self.file = open(f"{filename}.tmp", "w")
+        self.file.write('{"data":[' if compact else '{\n    "data": [')
+
+    def write(self, entry):
+        if self.compact:
+            data = json.dumps(entry, separators=(",", ":"))
+            self.file.write(f",{data}" if self.count else data)
+        else:
+            data = json.dumps(entry, indent=4).replace("\n", "\n        ")
+            self.file.write(f",\n        {data}" if self.count else f"\n        {data}")
+        self.count += 1
+
+    def close(self):
+        if self.compact:
+            self.file.write('],"schema_version":"0.1"}')
+        else:
+            self.file.write("\n    ]," if self.count else "],")
+            self.file.write('\n    "schema_version": "0.1"\n}')
+        self.file.close()
+        os.replace(f"{self.filename}.tmp", self.filename)
+
+    def discard(self):
+        self.file.close()
+        os.remove(f"{self.filename}.tmp")
+
+
+def convert(args):
+    with profiler.stage("get_media"):
+        media = get_media(args.offline, args.media_ttl)
+
+    with profiler.stage("load"):
+        wb = None
+        reader = args.reader
+        # The content store is only read if no reader is asked for
+        if reader is None and not args.no_store:
+            wb = content_store.open_store(args.input)
+            if wb is not None:
+                reader = "store"
+        reader = readers.get_reader(args.input, reader)
+        if wb is None:
+            wb = readers.open_workbook(args.input, reader)
+        source = args.input
+        if reader == "store":
+            source = content_store.store_path(args.input)
+        print(f"reading: {source} ({reader})")
+        sheets, all_languages, uniq_languages = get_import_info(wb)
+    cache = None
+    if args.cache:
+        cache = build_cache.BuildCache(
+            build_cache.cache_path(args.input),
+            "convert_to_json",
+            build_cache.source_digest(sys.modules[__name__], keywords),
+        )
+    content_count = 0
+    automation_count = 0
+    writers = {}
+    # Each sheet is parsed once, and kept until the last Turn number that uses it
+    parsed = {}
+    last_use = {values["sheet_name"]: key for key, values in sheets.items()}
+    try:
+        for key, values in sheets.items():
+            sheet_name = values["sheet_name"]
+            country_name = values["country_name"]
+            number_type = values["number_type"]
+            number_desc = f"content_{country_name}_{number_type}.json"
+            if number_desc not in writers:
+                writers[number_desc] = ContentWriter(
+                    number_desc.replace(" ", "_"), args.compact
+                )
+            print(f"processing: {key}")
+            if sheet_name not in parsed:
+                with profiler.stage(f"parse {sheet_name}") as stage:
+                    parsed[sheet_name] = parse_sheet(wb[sheet_name], cache)
+                    stage.rows += len(parsed[sheet_name])
+            languages = all_languages[country_name]
+            with profiler.stage(f"convert {key}") as stage:
+                for entry in get_entries(parsed[sheet_name], values, languages, media):
+                    writers[number_desc].write(entry)
+                    content_count += 1
+                    automation_count += len(entry["automators"])
+                    stage.rows += 1
+            if last_use[sheet_name] == key:
+                del parsed[sheet_name]
+        if cache is not None:
+            profiler.count("cache hits", cache.hits)
+            profiler.count("cache misses", cache.misses)
+            with profiler.stage("save cache"):
+                cache.save()
+    except BaseException:
+        for writer in writers.values():
+            writer.discard()
+        raise
+    finally:
+        if cache is not None:
+            cache.close()
+    with profiler.stage("close json"):
+        for writer in writers.values():
+            writer.close()
+    print("done")
+    print("")
+    print(f"Turn Numbers:  {len(writers.keys())}")
+    print(f"Languages:     {len(uniq_languages)}")
+    print(f"Sheets:        {len(sheets.keys())}")
+    print(f"Content:       {content_count}")
+    print(f"Automators:    {automation_count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=f"Converts the content in {FILENAME} to Turn import JSON files"
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Write the JSON files without indentation, to make them smaller",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only use the saved snapshot of the media, instead of doing an export",
+    )
+    parser.add_argument(
+        "--media-ttl",
+        type=int,
+        default=turn_export.CACHE_TTL,
+        help="Seconds to use the saved media snapshot for without checking Turn for "
+        "changes. By default, changes are checked for every time",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Only parse the rows that changed since the last run with --cache, "
+        "keeping a build cache next to the workbook",
+    )
+    parser.add_argument(
+        "--input",
+        default=FILENAME,
+        help="The workbook to convert, or a directory with a CSV file for each sheet",
+    )
+    parser.add_argument(
+        "--reader",
+        choices=sorted(readers.BACKENDS),
+        default=None,
+        help="How to read the input. xlsx reads the values straight from the XML, "
+        "which is faster than openpyxl, and store only reads the content store. By "
+        "default the content store is read if it's current, otherwise xlsx for a "
+        "workbook and csv for a directory",
+    )
+    parser.add_argument(
+        "--no-store",
+        action="store_true",
+        help=f"Read {FILENAME}, even if process_sheet.py has written a content store "
+        "for it",
+    )
+    add_profile_arguments(parser)
+    commands = parser.add_subparsers(dest="command")
+
+    upload = commands.add_parser(
+        "upload", help="Upload the JSON files to the Turn import API"
+    )
+    upload.add_argument(
+        "files", nargs="*", help="The files to upload, defaults to all content_*.json"
+    )
+    upload.add_argument(
+        "--token",
+        default=None,
+        help="The token to use for files without a TURN_TOKEN_{COUNTRY}_{TYPE} "
+        "environment variable",
+    )
+    upload.add_argument(
+        "--jobs", type=int, default=4, help="How many files to upload at once"
+    )
+    upload.add_argument(
+        "--max-bytes",
+        type=int,
+        default=turn_import.MAX_IMPORT_BYTES,
+        help="Split files bigger than this into several imports",
+    )
+    upload.add_argument(
+        "--gzip",
+        action="store_true",
+        help="Compress the uploads, if the Turn number accepts gzip encoded imports",
+    )
+
+    diff = commands.add_parser(
+        "diff",
+        help="Write only the content that differs from what's live on Turn, to upload",
+    )
+    diff.add_argument(
+        "files", nargs="*", help="The files to diff, defaults to all content_*.json"
+    )
+    diff.add_argument(
+        "--token",
+        default=None,
+        help="The token to use for files without a TURN_TOKEN_{COUNTRY}_{TYPE} "
+        "environment variable",
+    )
+    diff.add_argument(
+        "--output-directory",
+        default=turn_diff.DELTA_DIRECTORY,
+        help="The directory to write the changed content to",
+    )
+
+    simulator = commands.add_parser(
+        "simulate",
+        help="Check which content messages would trigger, and for ambiguous and "
+        "unreachable automators",
+    )
+    simulator.add_argument(
+        "files",
+        nargs="*",
+        help="The files to simulate, defaults to all content_*.json",
+    )
+    simulator.add_argument(
+        "--messages",
+        default=None,
+        help="A JSON lines message log to replay, with the text and the contact's "
+        'language on each line, eg. {"text": "menu", "language": "ENG"}',
+    )
+    simulator.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="Replay this many random messages, if there's no message log",
+    )
+    simulator.add_argument(
+        "--seed", type=int, default=0, help="The seed for the random messages"
+    )
+    simulator.add_argument(
+        "--output", default=None, help="Write the full report to this JSON file"
+    )
+
+    args = parser.parse_args()
+    if os.path.isdir(args.input) and args.reader not in (None, "csv"):
+        parser.error(f"--reader {args.reader} can't be used with CSV files")
+    with profile_run(args):
+        if args.command == "upload":
+            turn_import.main(args)
+        elif args.command == "diff":
+            turn_diff.main(args)
+        elif args.command == "simulate":
+            simulate.main(args)
+        else:
+            convert(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import csv
+import os
+import shutil
+
+EXTENSIONS = {".csv": ",", ".tsv": "\t"}
+
+
+def sheet_filename(title, extension=".csv"):
+    """
+    Returns the filename for the sheet `title` in a CSV bundle
+    """
+    return f"{title.replace(os.sep, '_')}{extension}"
+
+
+class CsvWorkbook:
+    """
+    Reads a directory of CSV or TSV files, one for each sheet of the workbook, named
+    after the sheet, eg. as exported from Google Sheets. The sheets are in the order of
+    their filenames. Empty cells are read as None, and all other values as strings.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.sheets = {}
+        for name in sorted(os.listdir(directory)):
+            title, extension = os.path.splitext(name)
+            if extension.lower() in EXTENSIONS:
+                path = os.path.join(directory, name)
+                self.sheets[title] = CsvSheet(
+                    title, path, EXTENSIONS[extension.lower()]
+                )
+
+    @property
+    def sheetnames(self):
+        return list(self.sheets)
+
+    def __iter__(self):
+        return iter(self.sheets.values())
+
+    def __getitem__(self, title):
+        if title not in self.sheets:
+            raise KeyError(f"Worksheet {title} does not exist.")
+        return self.sheets[title]
+
+    def close(self):
+        pass
+
+
+class CsvSheet:
+    """
+    A sheet of a CsvWorkbook. Rows are padded to the width of the widest row, like
+    the rows of an openpyxl worksheet are padded to its dimensions.
+    """
+
+    def __init__(self, title, path, delimiter=","):
+        self.title = title
+        self.path = path
+        self.delimiter = delimiter
+
+    def iter_rows(self, min_row=1, max_col=None, values_only=True):
+        if not values_only:
+            raise ValueError("CSV files only have values")
+        with open(self.path, newline="", encoding="utf-8-sig") as f:
+            rows = [
+                [value if value != "" else None for value in row]
+                for row in csv.reader(f, delimiter=self.delimiter)
+            ]
+        width = max_col or max((len(row) for row in rows), default=0)
+        for row in rows[min_row - 1 :]:
+            yield tuple(row[:width]) + (None,) * (width - len(row))
+
+
+class CsvBundleWriter:
+    """
+    Writes each sheet to a CSV file in a directory, in the same layout that
+    CsvWorkbook reads. Rows can be appended to the sheets in any order, like an
+    openpyxl write only workbook. The files are written to a temporary directory, that
+    only replaces `directory` on `save`.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.temporary = f"{directory}.tmp"
+        shutil.rmtree(self.temporary, ignore_errors=True)
+        os.makedirs(self.temporary)
+        self.files = {}
+        self.writers = {}
+
+    def create_sheet(self, title):
+        f = open(
+            os.path.join(self.temporary, sheet_filename(title)),
+            "w",
+            newline="",
+            encoding="utf-8",
+        )
+        self.files[title] = f
+        self.writers[title] = csv.writer(f)
+        return CsvBundleSheet(self, title)
+
+    def append(self, title, row):
+        self.writers[title].writerow(["" if value is None else value for value in row])
+
+    def close_files(self):
+        for f in self.files.values():
+            f.close()
+
+    def save(self, directory=None):
+        self.close_files()
+        directory = directory or self.directory
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(self.temporary, directory)
+
+    def discard(self):
+        self.close_files()
+        shutil.rmtree(self.temporary, ignore_errors=True)
+
+
+class CsvBundleSheet:
+    """
+    A sheet of a CsvBundleWriter, that rows can be appended to
+    """
+
+    def __init__(self, writer, title):
+        self.writer = writer
+        self.title = title
+
+    def append(self, row):
+        self.writer.append(self.title, row)
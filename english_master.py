@@ -0,0 +1,75 @@
+# The lookups that the index has, that rules can depend on
+LOOKUPS = ("keywords", "content", "titles")
+
+
+def strip_language(title, language=None):
+    """
+    Returns the content `title` without its language prefix, eg. "welcome" for
+    "eng_welcome". If the `language` isn't given, everything up to the first underscore
+    is taken to be the prefix.
+    """
+    if language is None:
+        return title.split("_", 1)[-1]
+    if title.startswith(language):
+        return title[len(language) + 1 :]
+    return title
+
+
+class EnglishMasterIndex:
+    """
+    The lookups into the English master that the other sheets need, built in a single
+    pass over its rows:
+    - `keywords`, the list of keywords for each content title
+    - `content`, the content for each content title that has content
+    - `titles`, the content title of each row number, to fall back on for rows whose
+      title isn't in the English master, and the set of all the content titles
+
+    Content titles are without their language prefix. This should be built after the
+    English master has been processed, so that it has the cleaned values.
+    """
+
+    def __init__(self):
+        self.keywords = {}
+        self.content = {}
+        self.titles = {}
+        self.content_titles = set()
+
+    @classmethod
+    def from_rows(cls, columns, rows, lookups=LOOKUPS):
+        """
+        Builds the index from the `rows` of values of the English master, excluding
+        the header, where `columns` is the ColumnMap of the header. Only the `lookups`
+        are filled in, so only the columns that they need have to be in the sheet.
+        """
+        index = cls()
+        title_column = columns["content title"]
+        language_column = columns["language"]
+        automation_column = columns["automation"] if "keywords" in lookups else None
+        content_column = columns["content"] if "content" in lookups else None
+        for number, row in enumerate(rows, start=2):
+            content_title = row[title_column]
+            if not content_title:
+                continue
+            content_title = strip_language(content_title, row[language_column])
+            if "titles" in lookups:
+                index.titles[number] = content_title
+                index.content_titles.add(content_title)
+            if automation_column is not None:
+                automation = row[automation_column] or ""
+                index.keywords[content_title] = automation.split(",")
+            if content_column is not None and row[content_column]:
+                index.content[content_title] = row[content_column]
+        return index
+
+    def lookup(self, name, content_title):
+        """
+        Returns the value of the lookup `name` for the `content_title`, or None
+        """
+        return getattr(self, name).get(content_title)
+
+    def has_title(self, content_title):
+        """
+        Returns whether the English master has a row with the `content_title`. Needs
+        the titles lookup.
+        """
+        return content_title in self.content_titles
@@ -0,0 +1,205 @@
+import argparse
+import json
+from collections import namedtuple
+
+import content_store
+import readers
+from convert_to_json import FILENAME, SHEETNAME, parse_row
+from keywords import clean_keyword
+from simulate import ANY_LANGUAGE, compile_automator, normalise_text
+
+# Where a keyword triggers content: the sheet, row number, language, and content title
+# of the row, and the contact language that the keyword's automator checks for, which
+# is ANY_LANGUAGE for language switches
+Occurrence = namedtuple(
+    "Occurrence", ("sheet", "row", "language", "title", "contact_language")
+)
+
+
+def turn_numbers(import_info):
+    """
+    Returns the sheets imported to each Turn number, `{country}_{type}`, from the
+    values of the `import_info` sheet
+    """
+    numbers = {}
+    for row in import_info:
+        if not row or str(row[0]).lower() == "sheet" or not row[1]:
+            continue
+        sheets = numbers.setdefault(f"{row[2]}_{row[1]}", [])
+        if row[0] not in sheets:
+            sheets.append(row[0])
+    return numbers
+
+
+def row_occurrences(sheet, number, row):
+    """
+    Yields the keyword and Occurrence of each keyword of the row of values, from the
+    automators that convert_to_json.py generates for it
+    """
+    title, content, language = row[0], row[1], row[2]
+    if not content or not language:
+        return
+    for automator in parse_row(row)["automators"]:
+        for contact_language, keyword in compile_automator(title, automator).keys:
+            yield keyword, Occurrence(sheet, number, language, title, contact_language)
+
+
+class KeywordIndex:
+    """
+    An inverted index of every keyword in the workbook to where it triggers content,
+    and of the sheets that are imported to each Turn number, built in a single pass
+    over the sheets. Collisions are keywords that trigger different content for the
+    same contact language on the same Turn number, across all of its sheets.
+    """
+
+    def __init__(self, numbers):
+        self.numbers = numbers
+        self.keywords = {}
+
+    @classmethod
+    def from_workbook(cls, workbook):
+        index = cls(turn_numbers(workbook[SHEETNAME].iter_rows(values_only=True)))
+        sheets = {sheet for sheets in index.numbers.values() for sheet in sheets}
+        for title in sorted(sheets):
+            index.add_sheet(
+                title,
+                workbook[title].iter_rows(min_row=2, max_col=5, values_only=True),
+            )
+        return index
+
+    def add_sheet(self, title, rows):
+        """
+        Adds the keywords of the `rows` of values of the sheet `title`, excluding the
+        header
+        """
+        for number, row in enumerate(rows, start=2):
+            row = tuple(row) + (None,) * (5 - len(row))
+            for keyword, occurrence in row_occurrences(title, number, row):
+                self.keywords.setdefault(keyword, []).append(occurrence)
+
+    def lookup(self, keyword, number=None):
+        """
+        Returns where `keyword` triggers content, on all Turn numbers, or only on
+        `number`
+        """
+        occurrences = self.keywords.get(normalise_text(clean_keyword(keyword)), [])
+        if number is None:
+            return occurrences
+        sheets = set(self.numbers.get(number, []))
+        return [o for o in occurrences if o.sheet in sheets]
+
+    def collisions(self):
+        """
+        Returns the keywords that trigger more than one content title for the same
+        contact language on the same Turn number. A language switch, that doesn't check
+        the contact's language, collides with the keyword in any language. Myths are
+        allowed to share keywords, so they aren't included.
+        """
+        sheet_numbers = {}
+        for number, sheets in self.numbers.items():
+            for sheet in sheets:
+                sheet_numbers.setdefault(sheet, []).append(number)
+        collisions = []
+        for keyword, occurrences in self.keywords.items():
+            by_number = {}
+            for o in occurrences:
+                if "myths" in str(o.title):
+                    continue
+                for number in sheet_numbers.get(o.sheet, []):
+                    by_number.setdefault(number, []).append(o)
+            for number, occurrences in by_number.items():
+                if len({o.title for o in occurrences}) < 2:
+                    continue
+                languages = {o.contact_language for o in occurrences}
+                languages = languages - {ANY_LANGUAGE} or {ANY_LANGUAGE}
+                for language in sorted(languages, key=json.dumps):
+                    conflicting = [
+                        o
+                        for o in occurrences
+                        if o.contact_language in (language, ANY_LANGUAGE)
+                    ]
+                    if len({o.title for o in conflicting}) > 1:
+                        collisions.append(
+                            {
+                                "number": number,
+                                "keyword": keyword,
+                                "contact_language": language,
+                                "occurrences": [o._asdict() for o in conflicting],
+                            }
+                        )
+        return collisions
+
+
+def describe(occurrence):
+    return f"{occurrence['title']} ({occurrence['sheet']} row {occurrence['row']})"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Finds keywords that trigger more than one content for the same "
+        "contact language on a Turn number, across all the sheets imported to it"
+    )
+    parser.add_argument(
+        "--input",
+        default=FILENAME,
+        help="The workbook, or a directory with a CSV file for each sheet. The "
+        "processed content is read from its content store, if it's current",
+    )
+    parser.add_argument(
+        "--reader",
+        choices=sorted(readers.BACKENDS),
+        default=None,
+        help="How to read the input, instead of its content store. Defaults to the "
+        "content store if it's current, otherwise xlsx for a workbook and csv for a "
+        "directory",
+    )
+    parser.add_argument(
+        "--keyword",
+        action="append",
+        default=[],
+        help="Instead of the collisions, list where this keyword triggers content. "
+        "Can be given more than once",
+    )
+    parser.add_argument(
+        "--number",
+        default=None,
+        help="Only look up keywords on this Turn number, eg. Zambia_Client",
+    )
+    parser.add_argument(
+        "--output", default=None, help="Write the collisions to this JSON file"
+    )
+    args = parser.parse_args()
+
+    workbook = None
+    if args.reader is None:
+        workbook = content_store.open_store(args.input)
+    if workbook is None:
+        workbook = readers.open_workbook(args.input, args.reader)
+    index = KeywordIndex.from_workbook(workbook)
+    workbook.close()
+
+    if args.keyword:
+        for keyword in args.keyword:
+            print(f"{keyword}:")
+            for occurrence in index.lookup(keyword, args.number):
+                print(
+                    f"  {describe(occurrence._asdict())}, "
+                    f"contact language {occurrence.contact_language}"
+                )
+        return
+
+    collisions = index.collisions()
+    for collision in collisions:
+        print(
+            f"{collision['number']}: {collision['keyword']} for contact language "
+            f"{collision['contact_language']}: "
+            + "; ".join(describe(o) for o in collision["occurrences"])
+        )
+    print(f"{len(collisions)} collisions on {len(index.numbers)} Turn numbers")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(collisions, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
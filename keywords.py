@@ -0,0 +1,175 @@
+import re
+from functools import lru_cache
+
+try:
+    import emoji
+except ImportError:  # Only needed to check emoji keywords, in process_sheet.py
+    emoji = None
+
+if emoji is not None:
+    # Compiled once here, instead of looking it up for every keyword. This is the same
+    # as emoji.get_emoji_regexp(), which was removed in emoji 2.0. Longer emoji come
+    # first, so that emoji made up of several characters are matched in full.
+    EMOJI_REGEXP = re.compile(
+        "|".join(re.escape(e) for e in sorted(emoji.EMOJI_DATA, key=len, reverse=True))
+    )
+    # Most keywords are words, so checking the first character against this is much
+    # quicker than trying every emoji in the regex
+    EMOJI_FIRST_CHARACTERS = frozenset(e[0] for e in emoji.EMOJI_DATA)
+else:
+    EMOJI_REGEXP = None
+    EMOJI_FIRST_CHARACTERS = frozenset()
+
+# We only remove skin type modifiers here, variation selectors and gender modifiers
+# aren't recognised the same as skin type modifiers by Turn, so those will have to be
+# specified as separate keywords.
+SKIN_TYPE_MODIFIERS = re.compile("[\U0001f3fb-\U0001f3ff]")
+
+VARIATION_SELECTORS = re.compile("[\ufe0e\ufe0f]")
+
+# Only keywords with a digit in them can be numbers, so we only try to convert those
+DIGIT = re.compile(r"\d")
+
+# The same keywords are repeated across all the language sheets, so we only need to
+# remember a few thousand of them to skip most of the work
+CACHE_SIZE = 4096
+
+
+def match_emoji(keyword):
+    """
+    Returns the match for the emoji at the start of the keyword, or None
+    """
+    if EMOJI_REGEXP is None:
+        raise ImportError(
+            "Normalising emoji needs the emoji package, see requirements.txt"
+        )
+    if keyword and keyword[0] in EMOJI_FIRST_CHARACTERS:
+        return EMOJI_REGEXP.match(keyword)
+    return None
+
+
+def base_emoji(keyword):
+    """
+    Strips any modifiers from the emoji, and just returns the base emoji. Without the
+    emoji package, the modifiers are stripped from any keyword, since they're only
+    used after emoji, so that messages can still be matched the way Turn does.
+    """
+    if EMOJI_REGEXP is None or match_emoji(keyword):
+        keyword = SKIN_TYPE_MODIFIERS.sub("", keyword)
+    return keyword
+
+
+class KeywordSet:
+    """
+    The unique, non-empty keywords of an automation cell, in the order that they were
+    added. Adding and checking for a keyword takes constant time, so merging two sets
+    of keywords is linear.
+    """
+
+    __slots__ = ("keywords",)
+
+    def __init__(self, keywords=()):
+        self.keywords = {}
+        self.update(keywords)
+
+    @classmethod
+    def from_cell(cls, value):
+        """
+        Returns the keywords of an automation cell, as they are, without normalising
+        them
+        """
+        return cls(str(value).split(",") if value else ())
+
+    def add(self, keyword):
+        if keyword:
+            self.keywords[keyword] = None
+
+    def update(self, keywords):
+        """
+        Adds the `keywords` that aren't in the set yet, after the ones that are
+        """
+        for keyword in keywords:
+            if keyword:
+                self.keywords[keyword] = None
+
+    def __contains__(self, keyword):
+        return keyword in self.keywords
+
+    def __iter__(self):
+        return iter(self.keywords)
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def __eq__(self, other):
+        if not isinstance(other, KeywordSet):
+            return NotImplemented
+        return list(self.keywords) == list(other.keywords)
+
+    def __repr__(self):
+        return f"KeywordSet({list(self.keywords)!r})"
+
+    def to_cell(self):
+        """
+        Returns the value of the automation cell for the keywords
+        """
+        return ",".join(self.keywords)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def clean_keyword(keyword):
+    """
+    Returns the keyword without whitespace, and numbers without any decimals, eg. "1"
+    for "1.0", since Turn matches the number the way that it's written
+    """
+    keyword = keyword.strip()
+    if DIGIT.search(keyword):
+        try:
+            return str(int(float(keyword)))
+        except (ValueError, OverflowError):
+            pass
+    return keyword
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalise_keyword(keyword):
+    """
+    Returns the keyword with whitespace, decimals, and emoji modifiers removed. If the
+    keyword has more than just an emoji in it, also returns it, without variation
+    selectors, to report as invalid, otherwise None
+    """
+    keyword = base_emoji(clean_keyword(keyword))
+    # Remove variation mods, since they're seen as separate by the regex
+    check = VARIATION_SELECTORS.sub("", keyword)
+    match = match_emoji(check)
+    if match and len(match[0]) < len(check):
+        return keyword, check
+    return keyword, None
+
+
+# Typed, so that eg. True and 1 are cached separately
+@lru_cache(maxsize=CACHE_SIZE, typed=True)
+def normalise_automation(value):
+    """
+    Normalises all the keywords in an automation cell in one call. Returns a tuple of
+    the unique, non-empty, normalised keywords in order, and a tuple of the keywords
+    that have more than just an emoji in them
+    """
+    # Convert to string from different types
+    if value is None:
+        value = ""
+    elif isinstance(value, float):
+        value = str(int(value))
+    elif isinstance(value, int):
+        value = str(value)
+
+    keywords = KeywordSet()
+    invalid = []
+    for keyword in value.split(","):
+        if not keyword.strip():
+            continue
+        keyword, error = normalise_keyword(keyword)
+        if error is not None:
+            invalid.append(error)
+        keywords.add(keyword)
+    return tuple(keywords), tuple(invalid)
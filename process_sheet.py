@@ -1,114 +1,664 @@
+import argparse
+import json
+import os
 import re
-from functools import lru_cache
-
-import emoji
-from openpyxl import load_workbook
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils import get_column_letter
+
+import english_master
+import keywords
+import readers
+from build_cache import BuildCache, MemoryCache, cache_path, source_digest
+from content_store import StoreWriter, store_path, write_store
+from csv_bundle import CsvBundleWriter
+from english_master import EnglishMasterIndex, strip_language
+from keywords import KeywordSet, base_emoji, normalise_automation  # noqa: F401
+from profiling import add_profile_arguments, profile_run, profiler
 
 FILENAME = "who_content.xlsx"
 
+COLUMN_NAMES = {
+    "content title": ("content_title", "content title", "automation title"),
+    "content": ("content",),
+    "language": ("language",),
+    "automation": ("automation",),
+}
+
 global is_error
 is_error = False
 
+# An error found by a rule in a row of a sheet. The column is the spreadsheet column
+# letter, or None if the error isn't about a single column.
+ContentError = namedtuple("ContentError", ("sheet", "row", "column", "rule", "message"))
 
-def error(message):
+
+def error(content_error):
     """
-    Prints out the error, and marks that we have an error. This allows us to print out
-    all errors, before raising an exception
+    Prints out the ContentError, and marks that we have an error. This allows us to
+    print out all errors, before raising an exception
     """
     global is_error
     is_error = True
-    print(message)
+    print(content_error.message)
 
 
-def base_emoji(keyword):
+def find_index(header, names):
     """
-    Strips any modifiers from the emoji, and just returns the base emoji
+    Returns the index in `header` of the first matching name, or None if none match
+    Matching is done with leading and trailing whitespace stripped, and case insensitive
     """
-    modifiers = [
-        # We only remove skin type modifiers here, variation selectors and gender
-        # modifiers aren't recognised the same as skin type modifiers by Turn, so
-        # those will have to be specified as separate keywords.
-        "\U0001f3fb",  # skin type 1-2
-        "\U0001f3fc",  # skin type 3
-        "\U0001f3fd",  # skin type 4
-        "\U0001f3fe",  # skin type 5
-        "\U0001f3ff",  # skin type 6
-    ]
-    if emoji.get_emoji_regexp().match(keyword):
-        for m in modifiers:
-            keyword = keyword.replace(m, "")
-
-    return keyword
+    for name in names:
+        name = name.strip().lower()
+        if name in header:
+            return header.index(name)
+    return None
 
 
-@lru_cache(maxsize=None)
 def get_index(sheet, *names):
     """
     Returns the column index for the first matching name, assuming first row is header
     Matching is done with leading and trailing whitespace stripped, and case insensitive
     """
     header = [(c.value or "").strip().lower() for c in sheet[1]]
-    for name in names:
-        name = name.strip().lower()
-        if name in header:
-            return header.index(name)
-    raise AttributeError(f"None of {names} found in header {header}")
+    index = find_index(header, names)
+    if index is None:
+        raise AttributeError(f"None of {names} found in header {header}")
+    return index
+
 
+class ColumnMap:
+    """
+    The indexes of the named columns in `COLUMN_NAMES` for a sheet, resolved once from
+    its header row, so that looking up a cell in a row is just indexing a list
+    """
 
-def get_cell(sheet, row, name):
+    def __init__(self, header, title=""):
+        self.title = title
+        self.header = [(value or "").strip().lower() for value in header]
+        self.indexes = {}
+        for name, aliases in COLUMN_NAMES.items():
+            index = find_index(self.header, aliases)
+            if index is not None:
+                self.indexes[name] = index
+
+    @classmethod
+    def from_sheet(cls, sheet):
+        return cls([c.value for c in sheet[1]], sheet.title)
+
+    def __getitem__(self, name):
+        if name not in self.indexes:
+            raise AttributeError(
+                f"Sheet {self.title} is missing the {name} column, expected one of "
+                f"{COLUMN_NAMES[name]} in header {self.header}"
+            )
+        return self.indexes[name]
+
+    def require(self, *names):
+        """
+        Raises an error for the first of the `names` that isn't a column in the sheet
+        """
+        for name in names:
+            self[name]
+
+
+def get_cell(sheet, row, name, columns=None):
     """
     Gets the value from the column `name` from the `row` in `sheet`
     """
-    column_names = {
-        "content title": ["content_title", "content title", "automation title"],
-        "content": ["content"],
-        "language": ["language"],
-        "automation": ["automation"],
-    }[name]
-    return row[get_index(sheet, *column_names)]
+    columns = columns or ColumnMap.from_sheet(sheet)
+    return row[columns[name]]
+
+
+def sheet_rows(sheet):
+    """
+    Returns the ColumnMap from the header row of `sheet`, and an iterator over the
+    values of the rest of the rows. This works for openpyxl worksheets, and the sheets
+    of any of the `readers` backends.
+    """
+    rows = sheet.iter_rows(values_only=True)
+    return ColumnMap(next(rows, ()), sheet.title), rows
 
 
 def get_keywords(sheet):
     """
     Returns a dictionary of content name and a list of keywords
     """
+    columns, rows = sheet_rows(sheet)
+    return EnglishMasterIndex.from_rows(columns, rows, ("keywords",)).keywords
+
+
+def get_content(sheet):
+    """
+    Returns a dictionary of content name and content
+    """
+    columns, rows = sheet_rows(sheet)
+    return EnglishMasterIndex.from_rows(columns, rows, ("content",)).content
 
-    def get_content_title(row):
-        content = get_cell(sheet, row, "content title").value or ""
-        language = get_cell(sheet, row, "language").value
-        if content.startswith(language):
-            return content[len(language) + 1 :]
-        return content
 
-    def get_keywords(row):
-        automation = get_cell(sheet, row, "automation").value or ""
-        return automation.split(",")
+SKIP_SHEETS = ("language codes", "importinfo")
+NON_ENGLISH_SKIP_SHEETS = SKIP_SHEETS + ("english master", "sepedi (sa)")
+ENGLISH_MASTER = "English master"
 
-    return {
-        get_content_title(row): get_keywords(row)
-        for row in sheet.iter_rows(min_row=2)
-        if get_cell(sheet, row, "content title").value
-    }
+RULES = []
 
 
-def get_content(sheet):
+def rule(columns, skip=SKIP_SHEETS, english=(), state=(), cacheable=True):
     """
-    Returns a dictionary of content name and content
+    Registers the decorated function as a per-row rule. Rules are applied in the order
+    that they're registered, so a rule can rely on the changes made by earlier rules.
+    `columns` is the list of columns that the rule uses, `skip` is the list of sheet
+    titles that the rule doesn't apply to, and `english` is the list of English master
+    lookups that the rule needs.
+
+    For the build cache, `state` is the list of state values that the rule carries
+    from one row to the next, and rules that depend on the other rows in the sheet in
+    any other way must not be `cacheable`. Those are run again on a cache hit, so they
+    should only report errors, and not change the row.
+    """
+
+    def register(func):
+        func.columns = columns
+        func.skip = skip
+        func.english = english
+        func.state = state
+        func.cacheable = cacheable
+        RULES.append(func)
+        return func
+
+    return register
+
+
+@rule(columns=("content title", "language"), state=("language",))
+def fill_language(row, state):
+    """
+    Ensures that there's a language field present. If not, fills in using the last
+    value for the language
+    """
+    columns = state["columns"]
+    if row[columns["content title"]]:
+        language = columns["language"]
+        if row[language]:
+            state["language"] = row[language]
+        else:
+            row[language] = state["language"]
+
+
+@rule(columns=("content title",))
+def normalise_content_title(row, state):
+    """
+    Normalises the content title:
+    - Whitespace trimmed from start and finish
+    - Non word characters replace with `-`
+    """
+    title = state["columns"]["content title"]
+    if row[title]:
+        row[title] = re.sub(r"\W+", "_", row[title].strip())
+
+
+@rule(columns=("automation", "content title"))
+def normalise_keywords(row, state):
+    """
+    Cleans up the keywords, by:
+    - Removing whitespace
+    - Removing empty and duplicate
+    - Removing emoji modifiers
+    - Error on keyword that contains more than just an emoji
+    """
+    columns = state["columns"]
+    automation = columns["automation"]
+    keywords, invalid = normalise_automation(row[automation])
+    for keyword in invalid:
+        state["report"](
+            f"Invalid keyword, more than just emoji: {keyword}; sheet: {columns.title}",
+            "automation",
+        )
+    row[automation] = ",".join(keywords)
+
+
+@rule(columns=("automation", "content title"), cacheable=False)
+def check_duplicate_keywords(row, state):
+    """
+    Errors on keywords that are duplicated across rows in the same sheet
+    """
+    columns = state["columns"]
+    for keyword in (row[columns["automation"]] or "").split(","):
+        # Skip myths, that's allowed to be duplicated
+        if not keyword or "myths" in row[columns["content title"]]:
+            continue
+        if keyword in state["seen_keywords"]:
+            state["report"](
+                f"Duplicate keyword {keyword}; sheet: {columns.title}", "automation"
+            )
+        state["seen_keywords"].add(keyword)
+
+
+@rule(
+    columns=("automation", "content title", "language"),
+    skip=NON_ENGLISH_SKIP_SHEETS,
+    english=("keywords", "titles"),
+)
+def merge_english_keywords(row, state):
+    """
+    Adds the english keywords to the row's keywords
+    """
+    english = state["english"]
+    columns = state["columns"]
+    automation = columns["automation"]
+    language = row[columns["language"]]
+    content_title = (row[columns["content title"]] or "").strip()
+    # Skip empty row
+    if not content_title:
+        return
+    content_title = strip_language(content_title, language)
+    if content_title not in english.keywords:
+        state["report"](
+            f"Missing english content {content_title}, sheet: {columns.title}",
+            "content title",
+        )
+        # get content title by row number if missing
+        content_title = english.titles.get(state["row"])
+        if content_title not in english.keywords:
+            return
+    keywords = KeywordSet.from_cell(row[automation])
+    keywords.update(english.keywords[content_title])
+    row[automation] = keywords.to_cell()
+
+
+@rule(columns=("content", "content title"))
+def check_row_content_length(row, state):
+    """
+    Errors if the content is longer than what WhatsApp allows in a single message
+    """
+    columns = state["columns"]
+    content = row[columns["content"]] or ""
+    if len(content) > 4096:
+        state["report"](
+            f"Content too long: {row[columns['content title']]}; "
+            f"sheet: {columns.title}",
+            "content",
+        )
+
+
+@rule(
+    columns=("content", "content title", "language"),
+    skip=NON_ENGLISH_SKIP_SHEETS,
+    english=("content", "titles"),
+)
+def fill_missing_content(row, state):
+    """
+    If the content is missing, fills it in using the English content. Errors if the
+    English master has the content title, but no content for it.
+    """
+    english = state["english"]
+    columns = state["columns"]
+    content_column = columns["content"]
+    content = (row[content_column] or "").strip()
+    content_title = (row[columns["content title"]] or "").strip()
+    language = row[columns["language"]]
+    # Skip empty rows
+    if not content_title or content:
+        return
+    content_title = strip_language(content_title, language)
+    if not english.has_title(content_title):
+        # Missing titles are reported by merge_english_keywords, so just get the
+        # content title by row number
+        content_title = english.titles.get(state["row"])
+        if not english.has_title(content_title):
+            return
+    english_content = english.content.get(content_title)
+    if english_content is None:
+        state["report"](
+            f"Missing english content for {content_title}, sheet: {columns.title}",
+            "content",
+        )
+        return
+    row[content_column] = english_content
+
+
+def get_english_index(columns, rows, lookups):
+    """
+    Returns the EnglishMasterIndex with the `lookups` that the rules need, from the
+    `rows` of values of the English master
+    """
+    return EnglishMasterIndex.from_rows(columns, rows, lookups)
+
+
+def get_sheet_rules(sheet, rules):
     """
+    Returns the rules that apply to `sheet`, and the English lookups that they need
+    """
+    title = sheet.title.strip().lower()
+    sheet_rules = [r for r in rules if title not in r.skip]
+    return sheet_rules, {lookup for r in sheet_rules for lookup in r.english}
 
-    def get_content_title(row):
-        content = get_cell(sheet, row, "content title").value or ""
-        language = get_cell(sheet, row, "language").value
-        if content.startswith(language):
-            return content[len(language) + 1 :]
-        return content
 
-    return {
-        get_content_title(row): get_cell(sheet, row, "content").value
-        for row in sheet.iter_rows(min_row=2)
-        if get_cell(sheet, row, "content title").value
-        and get_cell(sheet, row, "content").value
+def english_dependency(row, state, lookups):
+    """
+    Returns the English master values that the rules used for the processed `row`, so
+    that a cached row can be checked against the current English master. This follows
+    the lookups that `merge_english_keywords` and `fill_missing_content` do.
+    """
+    english = state["english"]
+    if not english or not lookups:
+        return None
+    columns = state["columns"]
+    content_title = (row[columns["content title"]] or "").strip()
+    if not content_title:
+        return None
+    content_title = strip_language(content_title, row[columns["language"]])
+    dependency = {
+        lookup: english.lookup(lookup, content_title)
+        for lookup in lookups
+        if lookup != "titles"
+    }
+    if "titles" in lookups and not english.has_title(content_title):
+        title = english.titles.get(state["row"])
+        dependency["titles"] = title
+        dependency["fallback"] = {
+            lookup: english.lookup(lookup, title)
+            for lookup in lookups
+            if lookup != "titles"
+        }
+    return dependency
+
+
+def process_cached_row(row, rules, state, cache):
+    """
+    Applies the `rules` to `row`, using the result from `cache` if the row, and the
+    state carried from the previous rows, haven't changed since it was cached, and the
+    English master values that it depends on are the same. Rules that aren't cacheable
+    are run again on the cached copy of the row that they saw, so that they get the
+    same state, and all errors are reported in the same order as without the cache.
+    """
+    columns = state["columns"]
+    report = state["report"]
+    lookups = {lookup for r in rules for lookup in r.english}
+    carried = sorted({name for r in rules for name in r.state})
+    key = cache.key(
+        columns.title,
+        columns.header,
+        [r.__name__ for r in rules],
+        [state[name] for name in carried],
+        row,
+    )
+    cached = cache.get(key)
+    if cached is not None:
+        if cached["english"] != english_dependency(cached["row"], state, lookups):
+            cached = None
+
+    errors = []
+    snapshots = {}
+    try:
+        for index, r in enumerate(rules):
+            state["report"] = lambda message, column=None, index=index: (
+                errors.append((index, message, column))
+            )
+            if cached is None:
+                if not r.cacheable:
+                    snapshots[index] = list(row)
+                r(row, state)
+            elif not r.cacheable:
+                r(list(cached["snapshots"][index]), state)
+    finally:
+        state["report"] = report
+
+    if cached is None:
+        cache.put(
+            key,
+            {
+                "row": row,
+                "snapshots": snapshots,
+                "errors": [e for e in errors if rules[e[0]].cacheable],
+                "state": {name: state[name] for name in carried},
+                "english": english_dependency(row, state, lookups),
+            },
+        )
+    else:
+        errors = sorted(errors + cached["errors"], key=lambda e: e[0])
+        state.update(cached["state"])
+        row = cached["row"]
+    for index, message, column in errors:
+        state["rule"] = rules[index].__name__
+        report(message, column)
+    return row
+
+
+def process_rows(columns, rows, rules, english=None, report=error, cache=None):
+    """
+    Applies the `rules`, in order, to each of the `rows` of values from the sheet that
+    `columns` describes, excluding the header row. Each row is a list that the rules
+    modify in place, and is yielded once all the rules have been applied to it. Errors
+    found by the rules are passed to `report` as ContentErrors. If there is a build
+    `cache`, unchanged rows are taken from it instead.
+
+    Rules report errors with `state["report"](message, column)`, where `column` is the
+    name of the column that the error is about.
+    """
+    columns.require(*{name for r in rules for name in r.columns})
+    rules = [profiler.timed_rule(r) for r in rules]
+
+    def report_error(message, column=None):
+        if column is not None:
+            column = get_column_letter(columns[column] + 1)
+        report(
+            ContentError(columns.title, state["row"], column, state["rule"], message)
+        )
+
+    state = {
+        "columns": columns,
+        "english": english,
+        "report": report_error,
+        "language": None,
+        "seen_keywords": set(),
     }
+    for number, row in enumerate(rows, start=2):
+        state["row"] = number
+        if cache is not None:
+            row = process_cached_row(row, rules, state, cache)
+        else:
+            for r in rules:
+                state["rule"] = r.__name__
+                r(row, state)
+        yield row
+
+
+def write_values(rows, values):
+    """
+    Writes the processed `values` back to the `rows` of cells that they were read from
+    """
+    for cells, row in zip(rows, values):
+        for cell, value in zip(cells, row):
+            if cell.value != value:
+                cell.value = value
+
+
+# The English lookups and build cache for the rules in a worker process, set when the
+# worker starts, so that they're only sent to each worker once, instead of with each
+# sheet
+worker_english = None
+worker_cache = None
+
+
+def init_worker(english, cache_entries=None, cache_version=""):
+    global worker_english, worker_cache
+    worker_english = english
+    if cache_entries is not None:
+        worker_cache = MemoryCache(cache_entries, cache_version)
+
+
+def process_sheet_rows(header, title, rows, rules):
+    """
+    Applies the `rules` to the `rows` of values of a sheet, in a worker process.
+    Returns the processed rows, the errors, so that the main process can report them in
+    order, and the build cache results that were added and used, to save.
+    """
+    errors = []
+    columns = ColumnMap(header, title)
+    rows = [list(row) for row in rows]
+    cache = worker_cache
+    if cache is not None:
+        cache = MemoryCache(cache.entries, cache.version)
+    rows = list(
+        process_rows(columns, rows, rules, worker_english, errors.append, cache)
+    )
+    if cache is None:
+        return rows, errors, None
+    return rows, errors, cache.results()
+
+
+def apply_rules(workbook, rules=RULES, jobs=1, cache=None):
+    """
+    Applies the `rules` to all of the content sheets, with a single pass over each
+    sheet. The English master is processed first, so that the English lookups that the
+    later rules need can be built once, from the cleaned English master.
+
+    If `jobs` is more than 1, the other sheets are processed by a pool of that many
+    worker processes. The results and errors are merged in the same order as they would
+    be processed in this process, so the output is the same.
+
+    If there is a build `cache`, rows that haven't changed are taken from it.
+    """
+    english = None
+    executor = None
+    pending = []
+    try:
+        for sheet in sorted(workbook, key=lambda s: s.title != ENGLISH_MASTER):
+            sheet_rules, lookups = get_sheet_rules(sheet, rules)
+            if not sheet_rules:
+                continue
+            if english is None and lookups:
+                english_sheet = workbook[ENGLISH_MASTER]
+                english = get_english_index(
+                    ColumnMap.from_sheet(english_sheet),
+                    (
+                        [c.value for c in cells]
+                        for cells in english_sheet.iter_rows(min_row=2)
+                    ),
+                    lookups,
+                )
+
+            columns = ColumnMap.from_sheet(sheet)
+            rows = list(sheet.iter_rows(min_row=2))
+            if jobs > 1 and sheet.title != ENGLISH_MASTER:
+                if executor is None:
+                    initargs = (english,)
+                    if cache is not None:
+                        initargs += (cache.entries, cache.version)
+                    executor = ProcessPoolExecutor(
+                        jobs, initializer=init_worker, initargs=initargs
+                    )
+                values = [tuple(c.value for c in cells) for cells in rows]
+                future = executor.submit(
+                    process_sheet_rows, columns.header, sheet.title, values, sheet_rules
+                )
+                pending.append((rows, future))
+                continue
+
+            with profiler.stage("rules", len(rows)):
+                values = ([c.value for c in cells] for cells in rows)
+                write_values(
+                    rows,
+                    process_rows(columns, values, sheet_rules, english, cache=cache),
+                )
+
+        for rows, future in pending:
+            with profiler.stage("rules", len(rows)):
+                values, errors, results = future.result()
+                for content_error in errors:
+                    error(content_error)
+                write_values(rows, values)
+                if cache is not None:
+                    cache.merge(**results)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def stream_rules(source, output, rules=RULES, cache=None, store=None, report=error):
+    """
+    Applies the `rules` to all the content sheets of the read only `source` workbook,
+    writing every sheet to the write only `output` workbook as it's processed, and to
+    the content `store` if there is one. Only the sheet being processed, and the
+    English master lookups, are kept in memory. Errors are passed to `report`.
+
+    If `output` is None, the sheets are only checked for errors, and the sheets that
+    no rules apply to aren't read at all.
+    """
+    destinations = {}
+    if output is not None:
+        destinations = {s.title: output.create_sheet(s.title) for s in source}
+    if store is not None:
+        for sheet in source:
+            store.create_sheet(sheet.title)
+    english = None
+    english_columns = None
+    english_rows = []
+    for sheet in sorted(source, key=lambda s: s.title != ENGLISH_MASTER):
+        sheet_rules, lookups = get_sheet_rules(sheet, rules)
+        if english is None and lookups:
+            if english_columns is None:
+                raise KeyError(f"Worksheet {ENGLISH_MASTER} does not exist.")
+            english = get_english_index(english_columns, english_rows, lookups)
+            english_rows = None
+
+        destination = destinations.get(sheet.title)
+        if (
+            destination is None
+            and store is None
+            and not sheet_rules
+            and sheet.title != ENGLISH_MASTER
+        ):
+            continue
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            continue
+        columns = ColumnMap(header, sheet.title)
+        if sheet.title == ENGLISH_MASTER:
+            english_columns = columns
+        if destination is not None:
+            destination.append(header)
+        if store is not None:
+            store.append(sheet.title, header)
+        rows = (list(row) for row in rows)
+        if sheet_rules:
+            rows = process_rows(columns, rows, sheet_rules, english, report, cache)
+        with profiler.stage("stream sheets") as stage:
+            for row in rows:
+                stage.rows += 1
+                if sheet.title == ENGLISH_MASTER and english_rows is not None:
+                    english_rows.append(row)
+                if destination is not None:
+                    destination.append(row)
+                if store is not None:
+                    store.append(sheet.title, row)
+
+
+class TooManyErrors(Exception):
+    pass
+
+
+def check_workbook(source, rules=RULES, cache=None, max_errors=None):
+    """
+    Applies the `rules` to the read only `source` workbook, without writing anything,
+    and returns the ContentErrors that they found. Stops once there are `max_errors`.
+    """
+    errors = []
+
+    def collect(content_error):
+        errors.append(content_error)
+        if max_errors and len(errors) >= max_errors:
+            raise TooManyErrors()
+
+    try:
+        stream_rules(source, None, rules, cache, report=collect)
+    except TooManyErrors:
+        pass
+    return errors
 
 
 def clean_keywords(workbook):
@@ -120,52 +670,7 @@ def clean_keywords(workbook):
     - Error on keyword that contains more than just an emoji
     - Error on duplicate across rows in same sheet
     """
-    for sheet in workbook:
-        if sheet.title.strip().lower() in ("language codes", "importinfo"):
-            continue
-
-        seen_keywords = set()
-        for row in sheet.iter_rows(min_row=2):
-            keywords = get_cell(sheet, row, "automation").value
-            # Convert to string from different types
-            if keywords is None:
-                keywords = ""
-            elif isinstance(keywords, float):
-                keywords = str(int(keywords))
-            elif isinstance(keywords, int):
-                keywords = str(keywords)
-            # Remove whitespace
-            keywords = [k.strip() for k in keywords.split(",")]
-            # Remove empty
-            keywords = [k for k in keywords if k]
-            # Remove emoji modifiers
-            keywords = [base_emoji(k) for k in keywords]
-            # Check for emoji keywords that have more than just the emoji in them
-            for keyword in keywords:
-                # Remove variation mods, since they're seen as separate by the regex
-                keyword = keyword.replace("\ufe0f", "")
-                keyword = keyword.replace("\ufe0e", "")
-                match = emoji.get_emoji_regexp().match(keyword)
-                if match and len(match[0]) < len(keyword):
-                    error(
-                        f"Invalid keyword, more than just emoji: {keyword}; "
-                        f"sheet: {sheet.title}"
-                    )
-            # Remove duplicate in row
-            deduped = []
-            for keyword in keywords:
-                if keyword not in deduped:
-                    deduped.append(keyword)
-            keywords = deduped
-            # Check for duplicate keywords across sheet
-            for keyword in keywords:
-                # Skip myths, that's allowed to be duplicated
-                if "myths" in get_cell(sheet, row, "content title").value:
-                    continue
-                if keyword in seen_keywords:
-                    error(f"Duplicate keyword {keyword}; sheet: {sheet.title}")
-                seen_keywords.add(keyword)
-            get_cell(sheet, row, "automation").value = ",".join(keywords)
+    apply_rules(workbook, [normalise_keywords, check_duplicate_keywords])
 
 
 def clean_language(workbook):
@@ -173,22 +678,7 @@ def clean_language(workbook):
     Goes through all the content sheets, and ensures that there's a language field
     present. If not, fills in using the last value for the language
     """
-    for sheet in workbook:
-        if sheet.title.strip().lower() in (
-            "language codes",
-            "importinfo",
-        ):
-            continue
-
-        lang = None
-        for row in sheet.iter_rows(min_row=2):
-            language = get_cell(sheet, row, "language")
-            content_title = get_cell(sheet, row, "content title")
-            if content_title.value:
-                if language.value:
-                    lang = language.value
-                else:
-                    language.value = lang
+    apply_rules(workbook, [fill_language])
 
 
 def clean_content_title(workbook):
@@ -197,104 +687,158 @@ def clean_content_title(workbook):
     - Whitespace trimmed from start and finish
     - Non word characters replace with `-`
     """
-    for sheet in workbook:
-        if sheet.title.strip().lower() in (
-            "language codes",
-            "importinfo",
-        ):
-            continue
-
-        for row in sheet.iter_rows(min_row=2):
-            content_title = get_cell(sheet, row, "content title")
-            if content_title.value:
-                content_title.value = re.sub(r"\W+", "_", content_title.value.strip())
+    apply_rules(workbook, [normalise_content_title])
 
 
 def add_english_keywords(workbook):
     """
     Goes through all of the non-english sheets, and adds the english keywords
     """
-    english_keywords = get_keywords(workbook["English master"])
-    for sheet in workbook:
-        if sheet.title.strip().lower() in (
-            "language codes",
-            "importinfo",
-            "english master",
-            "sepedi (sa)",
-        ):
-            continue
-
-        for row in sheet.iter_rows(min_row=2):
-            keyword_cell = get_cell(sheet, row, "automation")
-            keywords = (keyword_cell.value or "").split(",")
-            language = get_cell(sheet, row, "language").value
-            content_title = (get_cell(sheet, row, "content title").value or "").strip()
-            # Skip empty row
-            if not content_title:
-                continue
-            if content_title.startswith(language):
-                content_title = content_title[len(language) + 1 :]
-            if content_title not in english_keywords:
-                error(f"Missing english content {content_title}, sheet: {sheet.title}")
-                # get content title by row number if missing
-                content_title = workbook["English master"][f"A{row[0].row}"].value[4:]
-            for keyword in english_keywords[content_title]:
-                if keyword not in keywords:
-                    keywords.append(keyword)
-            keywords = [k for k in keywords if k]
-            keyword_cell.value = ",".join(keywords)
+    apply_rules(workbook, [merge_english_keywords])
 
 
 def check_content_length(workbook):
-    for sheet in workbook:
-        if sheet.title.strip().lower() in ("language codes", "importinfo"):
-            continue
-
-        for row in sheet.iter_rows(min_row=2):
-            content = get_cell(sheet, row, "content").value or ""
-            if len(content) > 4096:
-                error(
-                    f"Content too long: {get_cell(sheet, row, 'content title').value}; "
-                    f"sheet: {sheet.title}"
-                )
+    apply_rules(workbook, [check_row_content_length])
 
 
 def add_missing_content(workbook):
     """
     If content for a specific language is missing, fill in using the English content
     """
-    english_content = get_content(workbook["English master"])
-    for sheet in workbook:
-        if sheet.title.strip().lower() in (
-            "language codes",
-            "importinfo",
-            "english master",
-            "sepedi (sa)",
-        ):
-            continue
-
-        for row in sheet.iter_rows(min_row=2):
-            content_cell = get_cell(sheet, row, "content")
-            content = (content_cell.value or "").strip()
-            content_title = (get_cell(sheet, row, "content title").value or "").strip()
-            language = get_cell(sheet, row, "language").value
-            # Skip empty rows
-            if not content_title:
-                continue
-            if content_title.startswith(language):
-                content_title = content_title[len(language) + 1 :]
-            if not content:
-                content_cell.value = english_content[content_title]
+    apply_rules(workbook, [fill_missing_content])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=f"Cleans up the content in {FILENAME}, and saves it to 2{FILENAME}"
+    )
+    parser.add_argument(
+        "--input",
+        default=FILENAME,
+        help="The workbook to process, or a directory with a CSV file for each sheet. "
+        "The output is saved next to it, with a 2 in front of the name",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Process the workbook one sheet at a time, to keep memory usage low",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Process the language sheets in this many parallel processes",
+    )
+    parser.add_argument(
+        "--reader",
+        choices=["xlsx", "openpyxl"],
+        default=None,
+        help="How to read the workbook with --stream or --check. xlsx, the default, "
+        "reads the values straight from the XML, which is faster than openpyxl",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Only process the rows that changed since the last run with --cache, "
+        "keeping a build cache next to the workbook",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only check the workbook for errors, without saving anything, and output "
+        "them as JSON",
+    )
+    parser.add_argument(
+        "--max-errors",
+        type=int,
+        default=None,
+        help="With --check, stop after finding this many errors",
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_const",
+        dest="max_errors",
+        const=1,
+        help="With --check, stop at the first error",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="With --check, write the errors to this JSON file instead",
+    )
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    filename = args.input.rstrip(os.sep)
+    directory, name = os.path.split(filename)
+    output = os.path.join(directory, f"2{name}")
+    # CSV bundles can only be streamed, there's no workbook to edit
+    csv_input = os.path.isdir(filename)
+    stream = args.stream or csv_input
+    if stream and args.jobs > 1:
+        parser.error("--jobs can't be used with --stream or CSV files")
+    if csv_input and args.reader is not None:
+        parser.error("--reader can't be used with CSV files")
+
+    with profile_run(args):
+        cache = None
+        # A check doesn't write anything, including the build cache
+        if args.cache and not args.check:
+            cache = BuildCache(
+                cache_path(filename),
+                "process_sheet",
+                source_digest(sys.modules[__name__], keywords, english_master),
+            )
+        if args.check:
+            source = readers.open_workbook(filename, args.reader)
+            errors = check_workbook(source, max_errors=args.max_errors)
+            source.close()
+            errors = [e._asdict() for e in errors]
+            if args.output:
+                with open(args.output, "w", encoding="utf-8") as f:
+                    json.dump(errors, f, indent=4, ensure_ascii=False)
+            else:
+                print(json.dumps(errors, indent=4, ensure_ascii=False))
+            sys.exit(1 if errors else 0)
+        if stream:
+            source = readers.open_workbook(filename, args.reader)
+            if csv_input:
+                workbook = CsvBundleWriter(output)
+            else:
+                workbook = Workbook(write_only=True)
+            store = StoreWriter(store_path(filename), filename)
+            try:
+                stream_rules(source, workbook, cache=cache, store=store)
+            except BaseException:
+                store.discard()
+                if csv_input:
+                    workbook.discard()
+                raise
+            source.close()
+        else:
+            with profiler.stage("load"):
+                workbook = load_workbook(filename)
+            apply_rules(workbook, jobs=args.jobs, cache=cache)
+        if cache is not None:
+            profiler.count("cache hits", cache.hits)
+            profiler.count("cache misses", cache.misses)
+            with profiler.stage("save cache"):
+                cache.save()
+                cache.close()
+        if is_error:
+            if stream:
+                store.discard()
+            if csv_input:
+                workbook.discard()
+            raise Exception("There were errors, not saving")
+        with profiler.stage("save"):
+            workbook.save(output)
+        # A compact copy of the values, that convert_to_json.py can read much faster
+        with profiler.stage("write store"):
+            if stream:
+                store.close()
+            else:
+                write_store(store_path(filename), filename, workbook)
 
 
 if __name__ == "__main__":
-    workbook = load_workbook(FILENAME)
-    clean_language(workbook)
-    clean_content_title(workbook)
-    clean_keywords(workbook)
-    add_english_keywords(workbook)
-    check_content_length(workbook)
-    add_missing_content(workbook)
-    if is_error:
-        raise Exception("There were errors, not saving")
-    workbook.save(f"2{FILENAME}")
+    main()
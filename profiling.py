@@ -0,0 +1,217 @@
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import resource
+except ImportError:  # pragma: no cover, not available on Windows
+    resource = None
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of this process so far, in bytes, or None if it
+    can't be measured on this platform
+    """
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports this in bytes, Linux and the BSDs in kilobytes
+    if sys.platform == "darwin":
+        return maxrss
+    return maxrss * 1024
+
+
+class Stage:
+    """
+    The measurements of a stage of a run. Entering the same stage again adds to them.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.rows = 0
+        self.calls = 0
+        self.peak_rss = None
+        self.peak_traced = None
+
+    def report(self):
+        return {
+            "name": self.name,
+            "seconds": self.seconds,
+            "calls": self.calls,
+            "rows": self.rows,
+            "rows_per_second": self.rows / self.seconds if self.seconds else None,
+            "peak_rss": self.peak_rss,
+            "peak_traced": self.peak_traced,
+        }
+
+
+class Profiler:
+    """
+    Records the wall time, rows processed, and peak memory of each stage of a run,
+    the time spent in each rule, and counters such as cache hits. When it isn't
+    enabled, none of this is recorded, so that the instrumentation costs nothing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.rules = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    def enable(self, trace_memory=False):
+        """
+        Starts recording. If `trace_memory` is set, the peak of the memory allocated
+        by Python in each stage is traced too, which makes everything slower.
+        """
+        self.enabled = True
+        self.trace_memory = trace_memory
+        self.reset()
+        if trace_memory:
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        """
+        Measures the stage `name` for the duration of the block. The yielded Stage's
+        `rows` can be added to for the rows processed in the block.
+        """
+        if not self.enabled:
+            yield Stage(name)
+            return
+        stage = self.stages.setdefault(name, Stage(name))
+        stage.rows += rows
+        stage.calls += 1
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds += time.perf_counter() - start
+            stage.peak_rss = peak_rss()
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                stage.peak_traced = max(stage.peak_traced or 0, peak)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def timed_rule(self, rule):
+        """
+        Returns `rule`, wrapped to record the time spent in it, if enabled
+        """
+        if not self.enabled:
+            return rule
+
+        @wraps(rule)
+        def timed(row, state):
+            start = time.perf_counter()
+            try:
+                return rule(row, state)
+            finally:
+                self.rules[rule.__name__] = (
+                    self.rules.get(rule.__name__, 0.0) + time.perf_counter() - start
+                )
+
+        return timed
+
+    def report(self):
+        counters = dict(self.counters)
+        hits = counters.get("cache hits", 0)
+        lookups = hits + counters.get("cache misses", 0)
+        if lookups:
+            counters["cache hit rate"] = hits / lookups
+        return {
+            "seconds": time.perf_counter() - self.started,
+            "peak_rss": peak_rss(),
+            "stages": [stage.report() for stage in self.stages.values()],
+            "rules": self.rules,
+            "counters": counters,
+        }
+
+    def write(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.report(), f, indent=4)
+
+    def print_summary(self):
+        report = self.report()
+        print("")
+        print(f"{'Stage':48} {'Seconds':>8} {'Rows':>8} {'Rows/s':>10}")
+        for stage in report["stages"]:
+            rate = stage["rows_per_second"]
+            print(
+                f"{stage['name']:48} {stage['seconds']:8.3f} {stage['rows']:8} "
+                f"{rate if rate is not None else 0:10.0f}"
+            )
+        for name, seconds in report["rules"].items():
+            print(f"{'rule ' + name:48} {seconds:8.3f}")
+        for name, value in report["counters"].items():
+            print(
+                f"{name:48} {value:8.2f}"
+                if isinstance(value, float)
+                else f"{name:48} {value:8}"
+            )
+        if report["peak_rss"] is not None:
+            print(f"{'peak RSS MB':48} {report['peak_rss'] / 1e6:8.1f}")
+
+
+# The profiler for the current run, which the scripts enable with --profile
+profiler = Profiler()
+
+
+def add_profile_arguments(parser):
+    """
+    Adds the profiling arguments to the script's argument `parser`
+    """
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profile.json",
+        default=None,
+        help="Record the time, rows and memory of each stage, and write them to this "
+        "JSON file (default profile.json)",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="With --profile, also trace the peak memory allocated in each stage",
+    )
+    parser.add_argument(
+        "--cprofile",
+        default=None,
+        help="Write a cProfile dump of the run to this file, for eg. snakeviz",
+    )
+
+
+@contextmanager
+def profile_run(args):
+    """
+    Profiles the block according to the profiling `args`, writing the report and
+    cProfile dump when it's finished, even if it fails
+    """
+    if args.profile:
+        profiler.enable(args.trace_memory)
+    cprofile = cProfile.Profile() if args.cprofile else None
+    if cprofile is not None:
+        cprofile.enable()
+    try:
+        yield profiler
+    finally:
+        if cprofile is not None:
+            cprofile.disable()
+            cprofile.dump_stats(args.cprofile)
+        if args.profile:
+            profiler.print_summary()
+            profiler.write(args.profile)
@@ -0,0 +1,363 @@
+import os
+import posixpath
+import zipfile
+from functools import lru_cache
+from xml.etree.ElementTree import iterparse
+
+from openpyxl import load_workbook
+from openpyxl.formula.translate import Translator
+from openpyxl.styles.numbers import (
+    BUILTIN_FORMATS,
+    is_date_format,
+    is_timedelta_format,
+)
+from openpyxl.utils.cell import column_index_from_string, range_boundaries
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+from openpyxl.utils.datetime import from_excel, from_ISO8601
+
+import content_store
+from csv_bundle import CsvWorkbook
+
+MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIPS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+DIMENSION = f"{MAIN}dimension"
+ROW = f"{MAIN}row"
+VALUE = f"{MAIN}v"
+FORMULA = f"{MAIN}f"
+INLINE_STRING = f"{MAIN}is"
+TEXT = f"{MAIN}t"
+RUN = f"{MAIN}r"
+
+BACKENDS = {}
+
+
+def backend(name):
+    """
+    Registers the decorated function as a reader backend. The function takes the
+    filename of the workbook, and returns a workbook that can be iterated over for its
+    sheets, or indexed by sheet title, where each sheet has a `title`, and an
+    `iter_rows(min_row=1, max_col=None, values_only=True)` that yields tuples of values,
+    the same as an openpyxl read only worksheet
+    """
+
+    def register(func):
+        BACKENDS[name] = func
+        return func
+
+    return register
+
+
+def get_reader(filename, reader=None):
+    """
+    Returns the name of the backend that `filename` is read with: `reader` if it's
+    given, otherwise csv for a directory and xlsx for a workbook. Directories can only
+    be read as CSV bundles.
+    """
+    if os.path.isdir(filename):
+        if reader not in (None, "csv"):
+            raise ValueError(
+                f"Can't read the directory {filename} with the {reader} reader, "
+                "directories are read as CSV bundles"
+            )
+        return "csv"
+    if reader is None:
+        return "xlsx"
+    if reader not in BACKENDS:
+        raise ValueError(f"Unknown reader {reader}, expected one of {list(BACKENDS)}")
+    return reader
+
+
+def open_workbook(filename, reader=None):
+    """
+    Opens the workbook `filename` for reading with the `reader` backend, or the
+    default backend for it, see `get_reader`
+    """
+    return BACKENDS[get_reader(filename, reader)](filename)
+
+
+@backend("openpyxl")
+def open_openpyxl(filename):
+    return load_workbook(filename, read_only=True)
+
+
+@backend("store")
+def open_content_store(filename):
+    store = content_store.open_store(filename)
+    if store is None:
+        raise Exception(
+            f"No current content store for {filename}, run process_sheet.py first"
+        )
+    return store
+
+
+@backend("xlsx")
+def open_xlsx(filename):
+    return XlsxWorkbook(filename)
+
+
+@backend("csv")
+def open_csv(filename):
+    return CsvWorkbook(filename)
+
+
+@lru_cache(maxsize=None)
+def column_index(reference):
+    """
+    Returns the column number of a cell reference, eg. 3 for "C12"
+    """
+    return column_index_from_string(reference.rstrip("0123456789"))
+
+
+def cast_number(value):
+    """
+    Converts a number from the sheet XML into an int or a float, like openpyxl does
+    """
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def string_content(element):
+    """
+    Returns the text of a shared or inline string, without any of the rich text
+    formatting or phonetic runs
+    """
+    plain = []
+    formatted = []
+    for child in element:
+        if child.tag == TEXT:
+            plain.append(child.text or "")
+        elif child.tag == RUN:
+            formatted.extend(t.text or "" for t in child if t.tag == TEXT)
+    return "".join(plain + formatted)
+
+
+class XlsxWorkbook:
+    """
+    Reads the values of an xlsx workbook straight from its XML, without creating any
+    openpyxl cells or styles. Only the shared strings, the workbook's date styles, and
+    the list of sheets are read up front; each sheet is parsed as its rows are read.
+    """
+
+    def __init__(self, filename):
+        self.archive = zipfile.ZipFile(filename)
+        names = set(self.archive.namelist())
+        workbook_path = self.workbook_path()
+        directory = posixpath.dirname(workbook_path)
+
+        targets = {}
+        rels = posixpath.join(
+            directory, "_rels", f"{posixpath.basename(workbook_path)}.rels"
+        )
+        for _, element in iterparse(self.archive.open(rels)):
+            if element.tag == f"{PACKAGE}Relationship":
+                targets[element.get("Id")] = element.get("Target")
+
+        self.epoch = CALENDAR_WINDOWS_1900
+        self.sheets = {}
+        for _, element in iterparse(self.archive.open(workbook_path)):
+            if element.tag == f"{MAIN}workbookPr":
+                if element.get("date1904") in ("1", "true"):
+                    self.epoch = CALENDAR_MAC_1904
+            elif element.tag == f"{MAIN}sheet":
+                target = targets[element.get(f"{RELATIONSHIPS}id")]
+                if target.startswith("/"):
+                    path = target[1:]
+                else:
+                    path = posixpath.normpath(posixpath.join(directory, target))
+                title = element.get("name")
+                self.sheets[title] = XlsxSheet(self, title, path)
+
+        self.shared_strings = []
+        strings = posixpath.join(directory, "sharedStrings.xml")
+        if strings in names:
+            for _, element in iterparse(self.archive.open(strings)):
+                if element.tag == f"{MAIN}si":
+                    self.shared_strings.append(
+                        string_content(element).replace("x005F_", "")
+                    )
+                    element.clear()
+
+        self.date_styles = {}
+        styles = posixpath.join(directory, "styles.xml")
+        if styles in names:
+            self.date_styles = self.read_date_styles(styles)
+
+    def workbook_path(self):
+        """
+        Returns the path of the workbook part, from the package relationships
+        """
+        for _, element in iterparse(self.archive.open("_rels/.rels")):
+            if element.tag == f"{PACKAGE}Relationship" and element.get(
+                "Type", ""
+            ).endswith("/officeDocument"):
+                return element.get("Target").lstrip("/")
+        return "xl/workbook.xml"
+
+    def read_date_styles(self, path):
+        """
+        Returns the indexes of the cell styles that have a date or time number format,
+        mapped to whether it's a time delta format
+        """
+        formats = dict(BUILTIN_FORMATS)
+        date_styles = {}
+        in_cell_styles = False
+        index = 0
+        for event, element in iterparse(self.archive.open(path), ("start", "end")):
+            if element.tag == f"{MAIN}numFmt" and event == "end":
+                formats[int(element.get("numFmtId"))] = element.get("formatCode")
+            elif element.tag == f"{MAIN}cellXfs":
+                in_cell_styles = event == "start"
+            elif element.tag == f"{MAIN}xf" and in_cell_styles and event == "start":
+                code = formats.get(int(element.get("numFmtId", 0)))
+                if code and is_date_format(code):
+                    date_styles[index] = is_timedelta_format(code)
+                index += 1
+        return date_styles
+
+    @property
+    def sheetnames(self):
+        return list(self.sheets)
+
+    def __iter__(self):
+        return iter(self.sheets.values())
+
+    def __getitem__(self, title):
+        if title not in self.sheets:
+            raise KeyError(f"Worksheet {title} does not exist.")
+        return self.sheets[title]
+
+    def close(self):
+        self.archive.close()
+
+
+class XlsxSheet:
+    """
+    A sheet of an XlsxWorkbook. Rows are padded, and missing rows filled in, the same
+    as an openpyxl read only worksheet, so that the values are the same.
+    """
+
+    def __init__(self, workbook, title, path):
+        self.workbook = workbook
+        self.title = title
+        self.path = path
+
+    def iter_rows(self, min_row=1, max_col=None, values_only=True):
+        if not values_only:
+            raise ValueError("The xlsx reader only reads values")
+        # The shared formulas defined so far, by index, only for this iteration
+        shared_formulas = {}
+        max_row = None
+        width = max_col
+        empty_row = (None,) * max_col if max_col else ()
+        counter = min_row
+        number = 0
+        with self.workbook.archive.open(self.path) as source:
+            for _, element in iterparse(source):
+                tag = element.tag
+                if tag == ROW:
+                    reference = element.get("r")
+                    number = int(float(reference)) if reference else number + 1
+                    if max_row is not None and number > max_row:
+                        # Like openpyxl, fill in the rows up to the dimension
+                        while counter <= max_row:
+                            counter += 1
+                            yield empty_row
+                        return
+                    row = None
+                    if width is None and not empty_row:
+                        # Without a dimension, the rows are padded to the width of the
+                        # first row, the header
+                        row = self.parse_row(element, width, shared_formulas)
+                        empty_row = (None,) * len(row)
+                    if number >= counter:
+                        while counter < number:
+                            counter += 1
+                            yield empty_row
+                        counter += 1
+                        if row is None:
+                            row = self.parse_row(element, width, shared_formulas)
+                        yield row + empty_row[len(row) :]
+                    element.clear()
+                elif tag == DIMENSION:
+                    _, _, last_col, max_row = range_boundaries(element.get("ref"))
+                    width = max_col or last_col
+                    if width is not None:
+                        empty_row = (None,) * width
+
+    def parse_row(self, element, width, shared_formulas):
+        """
+        Returns the values of the row `element`, only decoding the cells up to `width`
+        """
+        values = {}
+        column = 0
+        for cell in element:
+            reference = cell.get("r")
+            column = column_index(reference) if reference else column + 1
+            if width is None or column <= width:
+                values[column] = self.parse_cell(cell, reference, shared_formulas)
+        if width is None:
+            if not values:
+                return ()
+            row = [None] * column
+        else:
+            row = [None] * width
+        for column, value in values.items():
+            row[column - 1] = value
+        return tuple(row)
+
+    def parse_cell(self, cell, reference, shared_formulas):
+        value = formula = inline = None
+        for child in cell:
+            tag = child.tag
+            if tag == VALUE:
+                value = child.text or None
+            elif tag == FORMULA:
+                formula = child
+            elif tag == INLINE_STRING:
+                inline = child
+        data_type = cell.get("t", "n")
+        if formula is not None:
+            return self.parse_formula(formula, reference, shared_formulas)
+        if data_type == "inlineStr":
+            return None if inline is None else string_content(inline)
+        if value is None:
+            return None
+        if data_type == "s":
+            return self.workbook.shared_strings[int(value)]
+        if data_type == "n":
+            value = cast_number(value)
+            style = int(cell.get("s", 0))
+            date_styles = self.workbook.date_styles
+            if style in date_styles:
+                try:
+                    value = from_excel(
+                        value, self.workbook.epoch, timedelta=date_styles[style]
+                    )
+                except (OverflowError, ValueError):
+                    value = "#VALUE!"
+            return value
+        if data_type == "b":
+            return bool(int(value))
+        if data_type == "d":
+            return from_ISO8601(value)
+        return value
+
+    def parse_formula(self, formula, reference, shared_formulas):
+        """
+        Returns the formula, like openpyxl does when it isn't reading only the cached
+        values. Shared formulas are translated from the cell that defines them, in
+        `shared_formulas`.
+        """
+        value = "="
+        if formula.text is not None:
+            value += formula.text
+        if formula.get("t") == "shared":
+            index = formula.get("si")
+            if index in shared_formulas:
+                origin, text = shared_formulas[index]
+                value = Translator(text, origin).translate_formula(reference)
+            elif formula.text is not None:
+                shared_formulas[index] = (reference, value)
+        return value
@@ -1,5 +1,20 @@
-function copyAppend() {
-  
+// The columns of each content sheet, counting from 1
+var CONTENT_COLUMN = 2;
+var LANGUAGE_COLUMN = 3;
+var AUTOMATION_COLUMN = 4;
+// Apps Script stops a run after 6 minutes, so we stop starting new sheets after this
+// many milliseconds, and continue in a new run
+var TIME_LIMIT = 4.5 * 60 * 1000;
+// The document property that lists the sheets that have been prepared in this run, and
+// when it was saved
+var CHECKPOINT = "copyAppendDone";
+// A checkpoint is only continued from within this many milliseconds of being saved, so
+// that it's only used by the scheduled continuation, and not by a later run on newly
+// downloaded content after a run failed
+var CONTINUE_WINDOW = 10 * 60 * 1000;
+
+function copyAppend(e) {
+
   /**
   * This script does the following:
   * Copies over automation keywords from the English sheet to all the other languages
@@ -9,195 +24,258 @@ function copyAppend() {
   * Validates the sheet for errors such as empty language fields etc
   * Validates emojis by replacing any skin tone modifier with the default modifier
   * For English and Sepedi, we only need to run the EngSepedi function to validate content and emoji
+  *
+  * Each sheet is read with a single getValues(), prepared in memory, and written back
+  * with a single setValues(), so all the sheets can be prepared in one run. After each
+  * sheet, it's saved in a checkpoint. If a run gets close to the Apps Script time
+  * limit, it schedules another run to continue from the checkpoint.
 */
 
-    /* SA languages 
-  	EngSepedi("English master");/*
-	replaceWithEnglish("Xitsonga (SA)");
-	replaceWithEnglish("TshiVenda (SA)");
-    replaceWithEnglish("Siswati (SA)");
-    replaceWithEnglish("Setswana (SA)");
-    replaceWithEnglish("Sesotho (SA)");
-	replaceWithEnglish("isiZulu (SA)");
-	replaceWithEnglish("isiXhosa (SA)");
-	replaceWithEnglish("Afrikaans (SA)");
-	EngSepedi("Sepedi (SA)");
-	replaceWithEnglish("Ndebele (SA)");
-    
-
-    /* Non-SA languages 
-	replaceWithEnglish("Sesotho (Lesotho)");
-  replaceWithEnglish("Nyanja (Malawi)");
-  replaceWithEnglish("Lomwe (Malawi)");
-	replaceWithEnglish("Chichewa (Malawi)");
-  replaceWithEnglish("Lusoga (Uganda)");
-	replaceWithEnglish("Luganda (Uganda)");
-	replaceWithEnglish("Gikuyu (Kenya)");
-	replaceWithEnglish("Kiswahili (Kenya)");
-  replaceWithEnglish("Dholuo (Kenya)");
-
-	replaceWithEnglish("Twi (Ghana)");
-	replaceWithEnglish("Dangme (Ghana)");
-  replaceWithEnglish("Bemba (Zambia)");*/
-	replaceWithEnglish("Ronga (Mozambique)");
-	replaceWithEnglish("Changana (Mozambique)");
-	replaceWithEnglish("Makhuwa (Mozambique)");
+	var sheets = [
+		/* SA languages */
+		[EngSepedi, "English master"],
+		[replaceWithEnglish, "Xitsonga (SA)"],
+		[replaceWithEnglish, "TshiVenda (SA)"],
+		[replaceWithEnglish, "Siswati (SA)"],
+		[replaceWithEnglish, "Setswana (SA)"],
+		[replaceWithEnglish, "Sesotho (SA)"],
+		[replaceWithEnglish, "isiZulu (SA)"],
+		[replaceWithEnglish, "isiXhosa (SA)"],
+		[replaceWithEnglish, "Afrikaans (SA)"],
+		[EngSepedi, "Sepedi (SA)"],
+		[replaceWithEnglish, "Ndebele (SA)"],
+
+		/* Non-SA languages */
+		[replaceWithEnglish, "Sesotho (Lesotho)"],
+		[replaceWithEnglish, "Nyanja (Malawi)"],
+		[replaceWithEnglish, "Lomwe (Malawi)"],
+		[replaceWithEnglish, "Chichewa (Malawi)"],
+		[replaceWithEnglish, "Lusoga (Uganda)"],
+		[replaceWithEnglish, "Luganda (Uganda)"],
+		[replaceWithEnglish, "Gikuyu (Kenya)"],
+		[replaceWithEnglish, "Kiswahili (Kenya)"],
+		[replaceWithEnglish, "Dholuo (Kenya)"],
+
+		[replaceWithEnglish, "Twi (Ghana)"],
+		[replaceWithEnglish, "Dangme (Ghana)"],
+		[replaceWithEnglish, "Bemba (Zambia)"],
+		[replaceWithEnglish, "Ronga (Mozambique)"],
+		[replaceWithEnglish, "Changana (Mozambique)"],
+		[replaceWithEnglish, "Makhuwa (Mozambique)"],
   /**
-  * For production uncomment the functions below and run them 
-  * Portuguese (Mozambique) and Portuguese (Angola)
-  * Also comment out replaceWithEnglish("Portuguese (Mozambique_Angola)") since it's for sandbox only
+  * For production uncomment the line for Portuguese (Angola) below
+  * Also comment out Portuguese (Mozambique_Angola) since it's for sandbox only
   * Portuguese ANgola and Mozambique Angola have the same content so we use a single sheet for sandbox
   * Whereas on the live line it's two different lines so we separate them
   */
-	replaceWithEnglish("Portuguese (Mozambique)");
-	//replaceWithEnglish("Portuguese (Angola)");
-  
-  
+		[replaceWithEnglish, "Portuguese (Mozambique)"],
+		//[replaceWithEnglish, "Portuguese (Angola)"],
+
    /**
-  * For sandbox uncomment the function below and run it 
-  * replaceWithEnglish("Portuguese (Mozambique_Angola)")
-  * Also comment out replaceWithEnglish("Portuguese (Mozambique)") and replaceWithEnglish("Portuguese (Angola)") since it's for prod only
-  
-  replaceWithEnglish("Portuguese (Mozambique_Angola)")
-  
-	replaceWithEnglish("Umbundu (Angola)");
-	replaceWithEnglish("Kimbundu (Angola)");*/
+  * For sandbox uncomment the lines below
+  * Also comment out Portuguese (Mozambique) and Portuguese (Angola) since they're for prod only
+
+		[replaceWithEnglish, "Portuguese (Mozambique_Angola)"],
+		[replaceWithEnglish, "Umbundu (Angola)"],
+		[replaceWithEnglish, "Kimbundu (Angola)"],
+  */
+	];
+
+	var start = Date.now();
+	var properties = PropertiesService.getDocumentProperties();
+	var done = [];
+	// Only a scheduled continuation, that is run by a trigger, continues from the
+	// checkpoint. Running it by hand always starts over from the first sheet.
+	if (e && e.triggerUid) {
+		done = readCheckpoint(properties, start);
+	} else {
+		resetCopyAppend();
+	}
+	for (var i = 0; i < sheets.length; i++) {
+		var sheetname = sheets[i][1];
+		if (done.indexOf(sheetname) != -1) {
+			continue;
+		}
+		if (Date.now() - start > TIME_LIMIT) {
+			Logger.log("Running out of time, continuing from " + sheetname + " in a new run");
+			scheduleContinue();
+			return;
+		}
+		sheets[i][0](sheetname);
+		done.push(sheetname);
+		properties.setProperty(CHECKPOINT, JSON.stringify({done: done, saved: Date.now()}));
+	}
+	properties.deleteProperty(CHECKPOINT);
+	deleteContinueTriggers();
 	Logger.clear();
 }
 
-function EngSepedi(sheetname) {
-	var app = SpreadsheetApp;
-	var sheet = app.getActiveSpreadsheet().getSheetByName(sheetname);
+// Returns the sheets that are done from the checkpoint, or none if there isn't a
+// checkpoint from the last few minutes
+function readCheckpoint(properties, now) {
+	var checkpoint = JSON.parse(properties.getProperty(CHECKPOINT) || "null");
+	if (!checkpoint || !checkpoint.saved || now - checkpoint.saved > CONTINUE_WINDOW) {
+		if (checkpoint) {
+			Logger.log("Ignoring the checkpoint from an earlier run, starting over");
+		}
+		return [];
+	}
+	return checkpoint.done;
+}
+
+// Removes the checkpoint and any scheduled continuation, so that the next run starts
+// over from the first sheet
+function resetCopyAppend() {
+	PropertiesService.getDocumentProperties().deleteProperty(CHECKPOINT);
+	deleteContinueTriggers();
+}
+
+// Schedules copyAppend to run again in a minute, to continue from the checkpoint
+function scheduleContinue() {
+	deleteContinueTriggers();
+	ScriptApp.newTrigger("copyAppend").timeBased().after(60 * 1000).create();
+}
+
+function deleteContinueTriggers() {
+	var triggers = ScriptApp.getProjectTriggers();
+	for (var i = 0; i < triggers.length; i++) {
+		if (triggers[i].getHandlerFunction() == "copyAppend") {
+			ScriptApp.deleteTrigger(triggers[i]);
+		}
+	}
+}
+
+// Returns the range of the first `columns` columns of all the rows of the sheet, or null
+// if the sheet is empty
+function dataRange(sheet, columns) {
 	var lastrow = sheet.getLastRow();
-	var cellLanguage, keywordArr, output, newKeyword;
-
-	for (var i = 1; i <= lastrow; i++) {
-		cellLanguage = sheet.getRange(i, 3).getValue();
-		keywordArr = sheet.getRange(i, 4).getValue();
-		//get keywords and emojis
-		keywordArr = sheet.getRange(i, 4).getValue()
-		//convert to string
-		keywordArr = keywordArr.toString();
-		//put in a list
-		keywordArr = keywordArr.split(',');
-		for (var j = 0; j < keywordArr.length; j++) {
-			if (isEmoji(keywordArr[j]) == true) {
-				keywordArr[j] = replaceModifier(keywordArr[j], '')
-			} else {}
-			output = keywordArr;
-			newKeyword = output.join(",");
-			//replace row with new value
-			sheet.getRange(i, 4).setValue(newKeyword)
+	if (lastrow < 1) {
+		return null;
+	}
+	return sheet.getRange(1, 1, lastrow, columns);
+}
+
+// Writes the prepared `values` back to the `range` that they were read from, in one call.
+// Cells that weren't changed are written back with their formula, if they have one, so
+// that only the cells that were changed lose their formulas.
+function writeValues(range, original, formulas, values) {
+	for (var i = 0; i < values.length; i++) {
+		for (var j = 0; j < values[i].length; j++) {
+			if (sameValue(values[i][j], original[i][j]) && formulas[i][j] != "") {
+				values[i][j] = formulas[i][j];
+			}
 		}
-		if (cellLanguage == "") {
-			Language = sheet.getRange(i - 1, 3).getValue();
-			sheet.getRange(i, 3).setValue(Language)
+	}
+	range.setValues(values);
+}
+
+function sameValue(a, b) {
+	if (a instanceof Date && b instanceof Date) {
+		return a.getTime() == b.getTime();
+	}
+	return a === b;
+}
+
+// Returns the keywords, with any skin tone modifiers removed from the emojis
+function replaceKeywordModifiers(keywords) {
+	//convert to string, and put in a list
+	var keywordArr = keywords.toString().split(',');
+	for (var j = 0; j < keywordArr.length; j++) {
+		if (isEmoji(keywordArr[j]) == true) {
+			keywordArr[j] = replaceModifier(keywordArr[j], '')
 		} else {}
 	}
+	return keywordArr.join(",");
+}
 
+// Returns the non-English `keywords`, with the English keywords that aren't in them
+// added to the end
+function addEnglishKeywords(keywords, englishKeywords) {
+	var cellNonEnglishAutomation = keywords.toString().split(", ");
+	var cellEnglishAutomation = englishKeywords.toString().split(", ");
+	//Do a set difference so we get only English keywords that are not in the current field
+	var newArr = cellEnglishAutomation.filter(f => !cellNonEnglishAutomation.includes(f));
+	newArr = newArr.join(", ");
+	if (newArr != "") {
+		return cellNonEnglishAutomation.join(", ") + ", " + newArr;
+	}
+	return keywords;
 }
 
-function replaceWithEnglish(sheetname) {
+// Fills in the language of the row at `i` from the row above it, if it's empty
+function fillLanguage(values, i, cellLanguage) {
+	if (cellLanguage == "") {
+		values[i][LANGUAGE_COLUMN - 1] = values[i - 1][LANGUAGE_COLUMN - 1];
+	} else {}
+}
+
+function EngSepedi(sheetname) {
 	var app = SpreadsheetApp;
-	var English = app.getActiveSpreadsheet().getSheetByName("English master");
 	var sheet = app.getActiveSpreadsheet().getSheetByName(sheetname);
-	var lastrow = sheet.getLastRow();
-	var cell, cellEnglish, cellEnglishAutomation, cellNonEnglishAutomation, cellLanguage, Language, keywordArr, output, newKeyword, newArr;
-
-	for (var i = 1; i <= lastrow; i++) {
-		cell = sheet.getRange(i, 2).getValue();
-		cellLanguage = sheet.getRange(i, 3).getValue();
-		if (cell != "") {
-
-			//get keywords and emojis
-			keywordArr = sheet.getRange(i, 4).getValue()
-			//convert to string
-			keywordArr = keywordArr.toString();
-			//put in a list
-			keywordArr = keywordArr.split(',');
-			for (var j = 0; j < keywordArr.length; j++) {
-				if (isEmoji(keywordArr[j]) == true) {
-					keywordArr[j] = replaceModifier(keywordArr[j], '')
-				} else {}
-				output = keywordArr;
-				newKeyword = output.join(",");
-				//replace row with new value
-				sheet.getRange(i, 4).setValue(newKeyword)
-
-				//get automation from non-English sheet
-				cellNonEnglishAutomation = sheet.getRange(i, 4).getValue();
-                cellNonEnglishAutomation = cellNonEnglishAutomation.toString();
-                cellNonEnglishAutomation = cellNonEnglishAutomation.split(", ");
-                
-				//get automation from English
-				cellEnglishAutomation = English.getRange(i, 4).getValue();
-                cellEnglishAutomation = cellEnglishAutomation.toString();
-                cellEnglishAutomation = cellEnglishAutomation.split(", ");
-              
-                //Do a set difference so we get only English keywords that are not in the current field
-                newArr = cellEnglishAutomation.filter(f => !cellNonEnglishAutomation.includes(f));
-                newArr = newArr.join(", ");
-                cellEnglishAutomation = cellEnglishAutomation.join(", ");
-                cellNonEnglishAutomation = cellNonEnglishAutomation.join(", ");
-
-				if (newArr != "") {
-					sheet.getRange(i, 4).setValue(cellNonEnglishAutomation + ", " + newArr)
-				} else {}
+	if (sheet == null) {
+		Logger.log("Skipping " + sheetname + ", there's no sheet with that name");
+		return;
+	}
+	var range = dataRange(sheet, AUTOMATION_COLUMN);
+	if (range == null) {
+		return;
+	}
+	var original = range.getValues();
+	var formulas = range.getFormulas();
+	var values = range.getValues();
+	var row, cellLanguage;
 
+	for (var i = 0; i < values.length; i++) {
+		row = values[i];
+		cellLanguage = row[LANGUAGE_COLUMN - 1];
+		//replace row with new value
+		row[AUTOMATION_COLUMN - 1] = replaceKeywordModifiers(row[AUTOMATION_COLUMN - 1]);
+		fillLanguage(values, i, cellLanguage);
+	}
+	writeValues(range, original, formulas, values);
+}
 
-			}
-		} else {}
-		if (cell == "") {
+function replaceWithEnglish(sheetname) {
+	var app = SpreadsheetApp;
+	var sheet = app.getActiveSpreadsheet().getSheetByName(sheetname);
+	if (sheet == null) {
+		Logger.log("Skipping " + sheetname + ", there's no sheet with that name");
+		return 0;
+	}
+	var range = dataRange(sheet, AUTOMATION_COLUMN);
+	if (range == null) {
+		return 0;
+	}
+	// The English master is read once for the whole sheet, instead of for each row
+	var englishRange = dataRange(
+		app.getActiveSpreadsheet().getSheetByName("English master"), AUTOMATION_COLUMN
+	);
+	var English = englishRange == null ? [] : englishRange.getValues();
+	var original = range.getValues();
+	var formulas = range.getFormulas();
+	var values = range.getValues();
+	var row, cell, cellLanguage, keywords, englishRow, cellEnglish, cellEnglishAutomation;
 
-			//modify and replace keyword with new emoji first
-			keywordArr = sheet.getRange(i, 4).getValue();
-			//convert to string
-			keywordArr = keywordArr.toString();
-            //put in a list
-			keywordArr = keywordArr.split(',');
-			for (var j = 0; j < keywordArr.length; j++) {
-				if (isEmoji(keywordArr[j]) == true) {
-					keywordArr[j] = replaceModifier(keywordArr[j], '')
-				} else {}
-				output = keywordArr;
-				newKeyword = output.join(",");
-				//replace row with new value
-				sheet.getRange(i, 4).setValue(newKeyword)
-			}
-			//get  content from English sheet
-			cellEnglish = English.getRange(i, 2).getValue();
-          
-
-			//get automation from non-English sheet
-		    cellNonEnglishAutomation = sheet.getRange(i, 4).getValue();
-            cellNonEnglishAutomation = cellNonEnglishAutomation.toString();
-            cellNonEnglishAutomation = cellNonEnglishAutomation.split(", ");
-                
-		    //get automation from English
-			cellEnglishAutomation = English.getRange(i, 4).getValue();
-            cellEnglishAutomation = cellEnglishAutomation.toString();
-            cellEnglishAutomation = cellEnglishAutomation.split(", ");
-          
-            //Do a set difference so we get only English keywords that are not in the current field
-            newArr = cellEnglishAutomation.filter(f => !cellNonEnglishAutomation.includes(f));
-            newArr = newArr.join(", ");
-            cellEnglishAutomation = cellEnglishAutomation.join(", ");
-            cellNonEnglishAutomation = cellNonEnglishAutomation.join(", ");
-          
-			//add content an automation to non-English sheet
-			sheet.getRange(i, 2).setValue(cellEnglish);
-
-			//Check that the English cell is not empty before attempting to append
-			if (newArr != "") {
-				sheet.getRange(i, 4).setValue(cellNonEnglishAutomation + ", " + newArr)
-			} else {}
+	for (var i = 0; i < values.length; i++) {
+		row = values[i];
+		cell = row[CONTENT_COLUMN - 1];
+		cellLanguage = row[LANGUAGE_COLUMN - 1];
+		// Rows past the end of the English master are empty
+		englishRow = i < English.length ? English[i] : null;
+		cellEnglish = englishRow == null ? "" : englishRow[CONTENT_COLUMN - 1];
+		cellEnglishAutomation = englishRow == null ? "" : englishRow[AUTOMATION_COLUMN - 1];
 
+		//modify and replace keyword with new emoji first
+		keywords = replaceKeywordModifiers(row[AUTOMATION_COLUMN - 1]);
+		if (cell == "") {
+			//add content from the English sheet
+			row[CONTENT_COLUMN - 1] = cellEnglish;
 		} else {}
-		if (cellLanguage == "") {
-			Language = sheet.getRange(i - 1, 3).getValue();
-			sheet.getRange(i, 3).setValue(Language)
-		} else {}
+		//add the English automation
+		row[AUTOMATION_COLUMN - 1] = addEnglishKeywords(keywords, cellEnglishAutomation);
+		fillLanguage(values, i, cellLanguage);
 	}
+	writeValues(range, original, formulas, values);
 	return 0;
 }
 
@@ -0,0 +1,351 @@
+import glob
+import json
+import random
+import time
+from collections import Counter
+from functools import lru_cache
+
+from keywords import CACHE_SIZE, base_emoji
+
+# The language of automators that don't check the contact's language
+ANY_LANGUAGE = "*"
+# Random messages that don't match any keyword, to send to the catch alls
+NOISE = ("hello", "hi there", "thanks", "ok", "?", "I need help please")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalise_text(text):
+    """
+    Returns the message or keyword `text` the way that it's matched: without leading or
+    trailing whitespace or emoji modifiers, case insensitively
+    """
+    return base_emoji(str(text).strip()).casefold()
+
+
+class Automator:
+    """
+    A compiled automator of the entry with the `question`. It matches the
+    (contact language, normalised text) `keys`, where the language is ANY_LANGUAGE if
+    it doesn't check the contact's language, and is a catch all for the `catch_all`
+    languages. `unsupported` is the reason it couldn't be compiled, if there is one.
+    """
+
+    def __init__(self, question, name):
+        self.question = question
+        self.name = name
+        self.keys = []
+        self.catch_all = []
+        self.sets_language = []
+        self.unsupported = None
+
+
+def compile_triggers(automator, triggers):
+    """
+    Adds the keys of the `triggers`, that all have to match, to the compiled
+    `automator`
+    """
+    language = ANY_LANGUAGE
+    keywords = None
+    catch_all = False
+    for trigger in triggers:
+        params = trigger.get("trigger_params") or {}
+        trigger_type = trigger.get("trigger_type")
+        if trigger_type == "message_inbound_catch_all":
+            catch_all = True
+        elif trigger_type != "message_inbound":
+            automator.unsupported = f"trigger type {trigger_type}"
+            return
+        if "contact_field_name" in params:
+            if (
+                params["contact_field_name"] != "language"
+                or params.get("contact_field_match") != "exact"
+            ):
+                automator.unsupported = f"contact field condition {params}"
+                return
+            value = params.get("contact_field_value")
+            if language not in (ANY_LANGUAGE, value):
+                # Can never match a single contact
+                return
+            language = value
+        matches = None
+        if "exact_match" in params:
+            matches = {normalise_text(params["exact_match"])}
+        elif "exact_matches" in params:
+            matches = {normalise_text(k) for k in params["exact_matches"]}
+        if matches is not None:
+            keywords = matches if keywords is None else keywords & matches
+    if catch_all:
+        automator.catch_all.append(language)
+    elif keywords is None:
+        automator.unsupported = "matches every message"
+    else:
+        automator.keys.extend((language, keyword) for keyword in sorted(keywords))
+
+
+def compile_automator(question, automator):
+    """
+    Returns the Automator that the import `automator` of the entry `question` compiles
+    to
+    """
+    compiled = Automator(question, automator["name"])
+    data = automator["config"]["data"]
+    if data.get("operator", "AND") == "AND":
+        groups = [data["triggers"]]
+    else:
+        groups = [[trigger] for trigger in data["triggers"]]
+    for triggers in groups:
+        compile_triggers(compiled, triggers)
+    for action in data.get("actions") or []:
+        params = action.get("action_params") or {}
+        if (
+            action.get("action_type") == "update_contact"
+            and params.get("contact_field_name") == "language"
+        ):
+            compiled.sets_language.append(params.get("contact_field_value"))
+    return compiled
+
+
+class Simulator:
+    """
+    The automators of an import file, compiled into indexes of the automators by
+    contact language and normalised keyword, and of the catch alls by contact language,
+    so that matching a message is a couple of dictionary lookups.
+
+    This models Turn's matching as: an automator matches a message if the contact's
+    language matches its language condition, and the message is one of its keywords;
+    catch alls only match if no keyword automator does. Contacts start without a
+    language, and can only get one from an automator that sets it.
+    """
+
+    def __init__(self, entries):
+        self.automators = []
+        self.keywords = {}
+        self.catch_alls = {}
+        for entry in entries:
+            for automator in entry.get("automators") or []:
+                if automator.get("is_deleted") or not automator.get("enabled", True):
+                    continue
+                compiled = compile_automator(entry["question"], automator)
+                index = len(self.automators)
+                self.automators.append(compiled)
+                for key in compiled.keys:
+                    self.keywords.setdefault(key, []).append(index)
+                for language in compiled.catch_all:
+                    self.catch_alls.setdefault(language, []).append(index)
+        self.languages = {None} | {
+            language
+            for automator in self.automators
+            for language in automator.sets_language
+        }
+
+    def match(self, language, text):
+        """
+        Returns the indexes of the automators that match the message `text` from a
+        contact whose language is `language`
+        """
+        text = normalise_text(text)
+        keywords = self.keywords
+        matched = keywords.get((language, text), []) + keywords.get(
+            (ANY_LANGUAGE, text), []
+        )
+        if matched:
+            return matched
+        return self.catch_alls.get(language, []) + self.catch_alls.get(ANY_LANGUAGE, [])
+
+    def questions(self, matched):
+        return sorted({self.automators[index].question for index in matched})
+
+    def ambiguous(self):
+        """
+        Returns the messages that match the automators of more than one entry, for
+        each language that a contact could have
+        """
+        languages = self.languages | {language for language, _ in self.keywords}
+        languages |= set(self.catch_alls)
+        languages = sorted(languages - {ANY_LANGUAGE}, key=json.dumps)
+        keywords = sorted({keyword for _, keyword in self.keywords})
+        ambiguous = []
+        for language in languages:
+            for keyword in keywords:
+                questions = self.questions(
+                    self.keywords.get((language, keyword), [])
+                    + self.keywords.get((ANY_LANGUAGE, keyword), [])
+                )
+                if len(questions) > 1:
+                    ambiguous.append(
+                        {
+                            "language": language,
+                            "keyword": keyword,
+                            "questions": questions,
+                        }
+                    )
+            questions = self.questions(
+                self.catch_alls.get(language, [])
+                + self.catch_alls.get(ANY_LANGUAGE, [])
+            )
+            if len(questions) > 1:
+                ambiguous.append(
+                    {"language": language, "keyword": None, "questions": questions}
+                )
+        return ambiguous
+
+    def unreachable(self):
+        """
+        Returns the automators that can never match a message, and why
+        """
+        unreachable = []
+        for automator in self.automators:
+            languages = {language for language, _ in automator.keys}
+            languages |= set(automator.catch_all)
+            if automator.unsupported:
+                reason = f"unsupported {automator.unsupported}"
+            elif not languages:
+                reason = "its triggers can never all match"
+            elif not (languages & (self.languages | {ANY_LANGUAGE})):
+                reason = "no automator sets the contact language to " + ", ".join(
+                    sorted(str(language) for language in languages)
+                )
+            else:
+                continue
+            unreachable.append(
+                {
+                    "question": automator.question,
+                    "name": automator.name,
+                    "reason": reason,
+                }
+            )
+        return unreachable
+
+    def replay(self, messages):
+        """
+        Matches all the `messages`, (language, text) pairs. Returns a summary of the
+        content that they matched.
+        """
+        start = time.perf_counter()
+        counts = Counter(messages)
+        matched = Counter()
+        automators = Counter()
+        unmatched = 0
+        ambiguous = 0
+        for (language, text), count in counts.items():
+            indexes = self.match(language, text)
+            if not indexes:
+                unmatched += count
+                continue
+            questions = self.questions(indexes)
+            if len(questions) > 1:
+                ambiguous += count
+            for question in questions:
+                matched[question] += count
+            for index in indexes:
+                automators[index] += count
+        seconds = time.perf_counter() - start
+        total = sum(counts.values())
+        return {
+            "messages": total,
+            "seconds": seconds,
+            "messages_per_second": total / seconds if seconds else None,
+            "unmatched": unmatched,
+            "ambiguous": ambiguous,
+            "matched": dict(matched.most_common()),
+            "never_matched": [
+                automator.name
+                for index, automator in enumerate(self.automators)
+                if index not in automators
+            ],
+        }
+
+    def synthetic_messages(self, count, seed=0):
+        """
+        Returns `count` random messages, mostly keywords from contacts with a language
+        that the keyword's automator matches, the rest not matching any keywords
+        """
+        rng = random.Random(seed)
+        keys = []
+        for language, keyword in self.keywords:
+            if language == ANY_LANGUAGE:
+                keys.extend(
+                    (contact_language, keyword) for contact_language in self.languages
+                )
+            else:
+                keys.append((language, keyword))
+        keys.sort(key=json.dumps)
+        noise = [
+            (language, text)
+            for language in sorted(self.languages, key=json.dumps)
+            for text in NOISE
+        ]
+        noise_count = count // 10 if keys else count
+        messages = rng.choices(keys, k=count - noise_count) if keys else []
+        messages += rng.choices(noise, k=noise_count)
+        return messages
+
+
+def read_messages(filename):
+    """
+    Yields the (language, text) of each message in the JSON lines message log, where
+    each line has the `text` of the message, and the `language` of the contact, which
+    is null for contacts without one
+    """
+    with open(filename) as f:
+        for line in f:
+            if line.strip():
+                message = json.loads(line)
+                yield message.get("language"), message["text"]
+
+
+def simulate_file(filename, messages=None, synthetic=0, seed=0):
+    """
+    Compiles the automators of the import file `filename`, and replays the `messages`
+    log against them, or `synthetic` random messages. Returns a report of the
+    ambiguous and unreachable automators, and the content that the messages matched.
+    """
+    with open(filename) as f:
+        entries = json.load(f)["data"]
+    simulator = Simulator(entries)
+    report = {
+        "file": filename,
+        "automators": len(simulator.automators),
+        "keys": len(simulator.keywords),
+        "ambiguous": simulator.ambiguous(),
+        "unreachable": simulator.unreachable(),
+    }
+    if messages is not None:
+        report["replay"] = simulator.replay(read_messages(messages))
+    elif synthetic:
+        report["replay"] = simulator.replay(
+            simulator.synthetic_messages(synthetic, seed)
+        )
+    return report
+
+
+def main(args):
+    filenames = args.files or sorted(glob.glob("content_*.json"))
+    reports = []
+    for filename in filenames:
+        report = simulate_file(filename, args.messages, args.synthetic, args.seed)
+        reports.append(report)
+        print(
+            f"{filename}: {report['automators']} automators, "
+            f"{report['keys']} keywords, {len(report['ambiguous'])} ambiguous, "
+            f"{len(report['unreachable'])} unreachable"
+        )
+        for ambiguous in report["ambiguous"]:
+            keyword = ambiguous["keyword"] or "catch all"
+            print(
+                f"  ambiguous: {keyword} for language {ambiguous['language']}: "
+                f"{', '.join(ambiguous['questions'])}"
+            )
+        for unreachable in report["unreachable"]:
+            print(f"  unreachable: {unreachable['name']}, {unreachable['reason']}")
+        replay = report.get("replay")
+        if replay:
+            print(
+                f"  replayed {replay['messages']} messages in "
+                f"{replay['seconds']:.2f}s ({replay['messages_per_second']:.0f}/s), "
+                f"{replay['unmatched']} unmatched, {replay['ambiguous']} ambiguous, "
+                f"{len(replay['never_matched'])} automators never matched"
+            )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=4)
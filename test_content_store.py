@@ -0,0 +1,59 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from openpyxl import Workbook
+
+from content_store import ContentStore, open_store, store_path, write_store
+
+
+class TestContentStore(TestCase):
+    def test_store(self):
+        """
+        Should read back the same values as the workbook, for the version of the
+        workbook that it was written from
+        """
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "English master"
+        ws.append(["Content title", "Content", "Language", "Automation"])
+        ws.append(["eng_welcome", "Welcome ✅", "eng", 5.0])
+        ws.append(["eng_menu", None, None, "menu"])
+        info = wb.create_sheet("ImportInfo")
+        info.append(["Sheet", "Type"])
+        info.append(["English master", "Client", "Zambia"])
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "content.xlsx")
+            wb.save(filename)
+            self.assertIsNone(open_store(filename))
+            write_store(store_path(filename), filename, wb)
+
+            store = open_store(filename)
+            self.assertEqual(store.sheetnames, ["English master", "ImportInfo"])
+            for sheet in wb:
+                self.assertEqual(
+                    list(store[sheet.title].iter_rows(values_only=True)),
+                    list(sheet.iter_rows(values_only=True)),
+                )
+            self.assertEqual(
+                list(store["English master"].iter_rows(min_row=2, max_col=2)),
+                [("eng_welcome", "Welcome ✅"), ("eng_menu", None)],
+            )
+            self.assertEqual(
+                list(store["ImportInfo"].iter_rows(max_col=4)),
+                [
+                    ("Sheet", "Type", None, None),
+                    ("English master", "Client", "Zambia", None),
+                ],
+            )
+            with self.assertRaises(KeyError):
+                store["Missing"]
+            store.close()
+
+            wb.save(filename)
+            os.utime(filename, ns=(0, 0))
+            self.assertIsNone(open_store(filename))
+            store = ContentStore(store_path(filename))
+            self.assertFalse(store.is_current(filename))
+            store.close()
@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from openpyxl import Workbook
+
+from convert_to_json import (
+    ContentWriter,
+    compile_replacer,
+    get_entries,
+    get_import_info,
+    parse_sheet,
+)
+
+
+class TestConvertToJson(TestCase):
+    def write(self, entries, compact=False):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "content.json")
+            writer = ContentWriter(filename, compact)
+            for entry in entries:
+                writer.write(entry)
+            writer.close()
+            self.assertEqual(os.listdir(directory), ["content.json"])
+            with open(filename) as f:
+                return f.read()
+
+    def test_content_writer(self):
+        """
+        Should write the same output as dumping the whole file with an indent of 4
+        """
+        entries = [
+            {"answer": "Hello\nthere ✅", "automators": [{"name": "a"}], "media": None},
+            {"answer": "Bye", "automators": [], "media": {"id": 1}},
+        ]
+        for data in ([], entries[:1], entries):
+            self.assertEqual(
+                self.write(data),
+                json.dumps({"data": data, "schema_version": "0.1"}, indent=4),
+            )
+
+    def test_content_writer_compact(self):
+        """
+        Should write the same data without any whitespace
+        """
+        entries = [{"answer": "Hello there", "automators": []}, {"answer": "Bye"}]
+        for data in ([], entries):
+            output = self.write(data, compact=True)
+            self.assertEqual(
+                json.loads(output), {"data": data, "schema_version": "0.1"}
+            )
+            self.assertNotIn(" ", output.replace("Hello there", ""))
+
+    def test_parse_sheet(self):
+        """
+        Should parse each content row once, into records that can be used for any number
+        """
+        wb = Workbook()
+        ws = wb.active
+        ws.append(["Automation title", "Content", "Language", "Automation", "Switch"])
+        ws.append(["eng_welcome", "Welcome to South Africa", "eng", "hi, 1.0", None])
+        ws.append(["eng_empty", None, "eng", "empty", None])
+        ws.append(["eng_language", "a\n\nb\n\nc\n\nd", "eng", None, "english"])
+
+        records = parse_sheet(ws)
+        self.assertEqual(
+            [(r["question"], len(r["automators"])) for r in records],
+            [("eng_welcome", 2), ("eng_language", 1)],
+        )
+        self.assertEqual(
+            records[0]["automators"][0]["config"]["data"]["triggers"][1],
+            {
+                "trigger_params": {"exact_matches": ["hi", "1"]},
+                "trigger_type": "message_inbound",
+            },
+        )
+        self.assertEqual(records[0]["automators"][1]["name"], "null-language-welcome")
+
+        values = {"replace": {"South Africa": "Zambia"}}
+        media = {"welcome": {"attachment_uri": "https://example.org/image.png"}}
+        entries = list(get_entries(records, values, ["English", "Bemba"], media))
+        self.assertEqual(entries[0]["answer"], "Welcome to Zambia")
+        self.assertEqual(entries[0]["attachment_uri"], "https://example.org/image.png")
+        self.assertIs(entries[0]["automators"], records[0]["automators"])
+        self.assertEqual(entries[1]["answer"], "a\n\nb\n\nEnglish\nBemba\n\nd")
+        self.assertEqual(entries[1]["attachment_uri"], None)
+
+    def test_compile_replacer(self):
+        """
+        Should replace all the values in one pass, preferring the longest match
+        """
+        replacer = compile_replacer(
+            {"South Africa": "Zambia", "Africa": "Continent", "0800": "0900", "": "x"}
+        )
+        self.assertEqual(
+            replacer("South Africa, Africa. Call 0800 (a.k.a 0800)"),
+            "Zambia, Continent. Call 0900 (a.k.a 0900)",
+        )
+        # Replacements aren't replaced again
+        replacer = compile_replacer({"a": "b", "b": "c"})
+        self.assertEqual(replacer("ab"), "bc")
+        self.assertEqual(compile_replacer({})("content"), "content")
+
+    def test_get_import_info_placeholders(self):
+        """
+        Should add the values of any `replace:` columns to the replacements
+        """
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "ImportInfo"
+        ws.append(["Sheet", "Type", "Country", "Number", "Replace: Clinic X", "Notes"])
+        ws.append(["English master", "Client", "Zambia", "=260", "Kabwe Clinic", "a"])
+        ws.append(["Bemba (Zambia)", "Client", "Zambia", "=260", None, None])
+
+        sheets, all_languages, uniq_languages = get_import_info(wb)
+        english = sheets["Zambia_English_master_Client"]
+        self.assertEqual(english["replace"]["Clinic X"], "Kabwe Clinic")
+        self.assertEqual(
+            english["replacer"]("Visit Clinic X in South Africa, call 27600109000"),
+            "Visit Kabwe Clinic in Zambia, call 260",
+        )
+        self.assertNotIn("Clinic X", sheets["Zambia_Bemba_Zambia_Client"]["replace"])
+        self.assertEqual(all_languages, {"Zambia": ["English master", "Bemba"]})
+        self.assertEqual(uniq_languages, ["English master", "Bemba"])
@@ -0,0 +1,64 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from csv_bundle import CsvBundleWriter
+from readers import open_workbook
+
+
+class TestCsvBundle(TestCase):
+    def test_round_trip(self):
+        """
+        Should read back the rows that were written, padded to the widest row, with
+        empty cells as None
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "content")
+            writer = CsvBundleWriter(path)
+            english = writer.create_sheet("English master")
+            info = writer.create_sheet("ImportInfo")
+            english.append(["Content title", "Content", "Language", "Automation"])
+            info.append(["Sheet", "Type"])
+            english.append(["eng_welcome", 'Hello,\n"there" ✅', "eng", None])
+            english.append(["eng_menu", None, None])
+            writer.save()
+            self.assertEqual(
+                sorted(os.listdir(path)), ["English master.csv", "ImportInfo.csv"]
+            )
+
+            wb = open_workbook(path)
+            self.assertEqual(wb.sheetnames, ["English master", "ImportInfo"])
+            self.assertEqual(
+                list(wb["English master"].iter_rows(min_row=2)),
+                [
+                    ("eng_welcome", 'Hello,\n"there" ✅', "eng", None),
+                    ("eng_menu", None, None, None),
+                ],
+            )
+            self.assertEqual(
+                list(wb["ImportInfo"].iter_rows(max_col=3)),
+                [("Sheet", "Type", None)],
+            )
+
+    def test_tsv(self):
+        """
+        Should read TSV files with tabs as the delimiter
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "Portuguese.tsv"), "w") as f:
+                f.write("Content title\tContent\npor_welcome\tOlá, tudo bem\n")
+            wb = open_workbook(directory)
+            self.assertEqual(
+                list(wb["Portuguese"].iter_rows()),
+                [("Content title", "Content"), ("por_welcome", "Olá, tudo bem")],
+            )
+
+    def test_discard(self):
+        """
+        Should leave nothing behind if the output is discarded
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            writer = CsvBundleWriter(os.path.join(directory, "content"))
+            writer.create_sheet("English master").append(["Content title"])
+            writer.discard()
+            self.assertEqual(os.listdir(directory), [])
@@ -0,0 +1,38 @@
+from unittest import TestCase
+
+from english_master import EnglishMasterIndex, strip_language
+from process_sheet import ColumnMap
+
+
+class TestEnglishMaster(TestCase):
+    def test_strip_language(self):
+        """
+        Should remove the language prefix, or everything up to the first underscore if
+        the language isn't given
+        """
+        self.assertEqual(strip_language("eng_menu", "eng"), "menu")
+        self.assertEqual(strip_language("mother", "eng"), "mother")
+        self.assertEqual(strip_language("eng_menu_1"), "menu_1")
+
+    def test_from_rows(self):
+        """
+        Should index the keywords, content, and title of each row in a single pass,
+        only for the lookups asked for
+        """
+        columns = ColumnMap(
+            ("Content title", "Content", "Language", "Automation"), "English master"
+        )
+        rows = [
+            ("eng_menu", "Menu", "eng", "menu,0"),
+            (None, None, None, None),
+            ("eng_help", None, "eng", None),
+        ]
+        index = EnglishMasterIndex.from_rows(columns, rows)
+        self.assertEqual(index.keywords, {"menu": ["menu", "0"], "help": [""]})
+        self.assertEqual(index.content, {"menu": "Menu"})
+        self.assertEqual(index.titles, {2: "menu", 4: "help"})
+        self.assertEqual(index.lookup("content", "help"), None)
+
+        index = EnglishMasterIndex.from_rows(columns, rows, ("content",))
+        self.assertEqual((index.keywords, index.titles), ({}, {}))
+        self.assertEqual(index.lookup("content", "menu"), "Menu")
@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+from openpyxl import Workbook
+
+from keyword_index import KeywordIndex
+
+
+class TestKeywordIndex(TestCase):
+    def setUp(self):
+        wb = Workbook()
+        english = wb.active
+        english.title = "English master"
+        english.append(["Content title", "Content", "Language", "Automation", "Switch"])
+        english.append(["eng_menu", "Menu", "eng", "menu,0", None])
+        english.append(["eng_help", "Help", "eng", "help", None])
+        english.append(["eng_language", "Languages", "eng", None, "english"])
+        english.append(["eng_myths_1", "Myth", "eng", "myth", None])
+        english.append(["eng_myths_2", "Myth", "eng", "myth", None])
+        bemba = wb.create_sheet("Bemba (Zambia)")
+        bemba.append(["Content title", "Content", "Language", "Automation", "Switch"])
+        bemba.append(["bem_menu", "Menu", "bem", "Menu,0,English", None])
+        bemba.append(["bem_help", "Help", "bem", "0", None])
+        bemba.append(["bem_empty", None, "bem", "help", None])
+        info = wb.create_sheet("ImportInfo")
+        info.append(["Sheet", "Type", "Country"])
+        for sheet in ("English master", "Bemba (Zambia)"):
+            info.append([sheet, "Client", "Zambia"])
+        info.append(["English master", "Client", "Mozambique"])
+        self.index = KeywordIndex.from_workbook(wb)
+
+    def test_lookup(self):
+        """
+        Should find where a keyword triggers content, on all or one Turn number
+        """
+        self.assertEqual(
+            [(o.title, o.contact_language) for o in self.index.lookup(" MENU ")],
+            [("bem_menu", "BEM"), ("eng_menu", "ENG"), ("eng_menu", None)],
+        )
+        self.assertEqual(
+            [o.row for o in self.index.lookup("menu", "Mozambique_Client")], [2, 2]
+        )
+        self.assertEqual(self.index.lookup("help", "Mozambique_Client")[0].row, 3)
+
+    def test_collisions(self):
+        """
+        Should only report keywords that trigger different content for the same
+        contact language on a Turn number, including language switches
+        """
+        self.assertEqual(
+            [
+                (
+                    c["number"],
+                    c["keyword"],
+                    c["contact_language"],
+                    [o["title"] for o in c["occurrences"]],
+                )
+                for c in self.index.collisions()
+            ],
+            [
+                ("Zambia_Client", "0", "BEM", ["bem_menu", "bem_help"]),
+                ("Zambia_Client", "english", "BEM", ["bem_menu", "eng_language"]),
+            ],
+        )
+
+    def test_catchall(self):
+        """
+        Should only leave out the keywords that convert_to_json.py makes a catch all
+        for, and index a mixed case catchall as a keyword, the same as it's converted
+        """
+        wb = Workbook()
+        english = wb.active
+        english.title = "English master"
+        english.append(["Content title", "Content", "Language", "Automation", "Switch"])
+        english.append(["eng_fallback", "Sorry", "eng", "CATCHALL", None])
+        english.append(["eng_other", "Other", "eng", "Catchall", None])
+        info = wb.create_sheet("ImportInfo")
+        info.append(["Sheet", "Type", "Country"])
+        info.append(["English master", "Client", "Zambia"])
+        index = KeywordIndex.from_workbook(wb)
+        self.assertEqual(
+            [(o.title, o.contact_language) for o in index.lookup("catchall")],
+            [("eng_other", "ENG"), ("eng_other", None)],
+        )
@@ -0,0 +1,73 @@
+from unittest import TestCase, mock
+
+from keywords import (
+    KeywordSet,
+    base_emoji,
+    clean_keyword,
+    normalise_automation,
+    normalise_keyword,
+)
+
+
+class TestKeywords(TestCase):
+    def test_normalise_keyword(self):
+        """
+        Should strip whitespace and emoji modifiers, and return the keyword to report if
+        it has more than just an emoji in it
+        """
+        self.assertEqual(normalise_keyword(" hi "), ("hi", None))
+        self.assertEqual(normalise_keyword("👍🏿"), ("👍", None))
+        self.assertEqual(normalise_keyword("❤️"), ("❤️", None))
+        self.assertEqual(normalise_keyword("👍foo"), ("👍foo", "👍foo"))
+        self.assertEqual(normalise_keyword("👍🏿️foo"), ("👍️foo", "👍foo"))
+
+    def test_without_emoji(self):
+        """
+        Should still strip the skin tones for matching without the emoji package, but
+        not check keywords
+        """
+        with mock.patch("keywords.EMOJI_REGEXP", None):
+            self.assertEqual(base_emoji("👋🏾"), "👋")
+            self.assertEqual(base_emoji("hello"), "hello")
+            with self.assertRaises(ImportError):
+                normalise_keyword("👋🏾bye")
+
+    def test_normalise_automation(self):
+        """
+        Should normalise all the keywords in the cell, removing empty and duplicate
+        keywords, and converting numbers to strings
+        """
+        self.assertEqual(
+            normalise_automation("hi, hello,,hi,👍🏿,👍"), (("hi", "hello", "👍"), ())
+        )
+        self.assertEqual(normalise_automation(None), ((), ()))
+        self.assertEqual(normalise_automation(6.2), (("6",), ()))
+        self.assertEqual(normalise_automation(5), (("5",), ()))
+        self.assertEqual(normalise_automation(True), (("True",), ()))
+        self.assertEqual(
+            normalise_automation("a,👍foo,b,👍foo"),
+            (("a", "👍foo", "b"), ("👍foo",) * 2),
+        )
+        self.assertEqual(normalise_automation(" 01 ,1.0,1"), (("1",), ()))
+
+    def test_clean_keyword(self):
+        """
+        Should strip whitespace, and remove the decimals from numbers
+        """
+        self.assertEqual(clean_keyword(" 1.0 "), "1")
+        self.assertEqual(clean_keyword("2nd"), "2nd")
+        self.assertEqual(clean_keyword("nan"), "nan")
+        self.assertEqual(clean_keyword("1e999"), "1e999")
+        self.assertEqual(clean_keyword("1\ufe0f\u20e3"), "1\ufe0f\u20e3")
+        self.assertEqual(clean_keyword(" 👍🏿 "), "👍🏿")
+
+    def test_keyword_set(self):
+        """
+        Should keep the unique, non-empty keywords in the order they were added
+        """
+        keywords = KeywordSet.from_cell("menu,,hi,menu")
+        keywords.update(["hello", "hi", "", "menu", "0"])
+        self.assertEqual(list(keywords), ["menu", "hi", "hello", "0"])
+        self.assertIn("hello", keywords)
+        self.assertEqual(keywords.to_cell(), "menu,hi,hello,0")
+        self.assertEqual(KeywordSet.from_cell(None).to_cell(), "")
@@ -1,20 +1,30 @@
 import io
+import os
+import tempfile
+import types
 from contextlib import redirect_stdout
 from unittest import TestCase
 
-from openpyxl import Workbook
+from openpyxl import Workbook, load_workbook
 
+from build_cache import BuildCache, MemoryCache, source_digest
 from process_sheet import (
+    ColumnMap,
+    ContentError,
     add_english_keywords,
     add_missing_content,
+    apply_rules,
     base_emoji,
     check_content_length,
+    check_workbook,
     clean_content_title,
     clean_keywords,
     clean_language,
     get_cell,
     get_index,
     get_keywords,
+    process_rows,
+    stream_rules,
 )
 
 
@@ -46,6 +56,41 @@ class TestProcessSheet(TestCase):
         with self.assertRaises(AttributeError):
             get_index(ws, "no", "matching", "columns")
 
+    def test_column_map(self):
+        """
+        Resolves the named columns from the header once, and errors on missing columns
+        """
+        wb = Workbook()
+        ws = wb.active
+        ws["A1"] = " Automation Title"
+        ws["C1"] = "LANGUAGE"
+        ws["D1"] = "automation"
+
+        columns = ColumnMap.from_sheet(ws)
+        self.assertEqual(columns["content title"], 0)
+        self.assertEqual(columns["language"], 2)
+        self.assertEqual(columns["automation"], 3)
+        columns.require("content title", "language")
+        with self.assertRaisesRegex(
+            AttributeError, "Sheet Sheet is missing the content"
+        ):
+            columns["content"]
+        with self.assertRaises(AttributeError):
+            columns.require("language", "content")
+
+    def test_clean_keywords_missing_column(self):
+        """
+        Should error before changing any rows if a column that the rule needs is missing
+        """
+        wb = Workbook()
+        ws = wb.active
+        ws["A1"] = "Automation"
+        ws["A2"] = "test"
+
+        with self.assertRaisesRegex(AttributeError, "missing the content title column"):
+            clean_keywords(wb)
+        self.assertEqual(ws["A2"].value, "test")
+
     def test_get_cell(self):
         """
         Returns the cell in the row according to the name of the cell
@@ -335,3 +380,305 @@ class TestProcessSheet(TestCase):
         self.assertEqual(ws["B3"].value, "English Content")
         self.assertEqual(ws["B4"].value, "portuguese content")
         self.assertEqual(output.getvalue(), "")
+
+    def test_apply_rules(self):
+        """
+        Should apply all the rules in a single pass over each sheet, with the same
+        result as running each of the cleaning steps one after another
+        """
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Portuguese"
+        ws["A1"] = "Content title"
+        ws["A2"] = "por_test "
+        ws["A3"] = "por_other-test"
+        ws["B1"] = "Automation"
+        ws["B2"] = "olá, 👍🏿"
+        ws["C1"] = "Language"
+        ws["C2"] = "por"
+        ws["D1"] = "Content"
+        ws["D2"] = "Conteúdo"
+
+        eng_ws = wb.create_sheet(title="English master")
+        eng_ws["A1"] = "Content title"
+        eng_ws["A2"] = "eng_test"
+        eng_ws["A3"] = "eng other test"
+        eng_ws["B1"] = "Automation"
+        eng_ws["B2"] = "hi,hi"
+        eng_ws["B3"] = "other"
+        eng_ws["C1"] = "Language"
+        eng_ws["C2"] = "eng"
+        eng_ws["D1"] = "Content"
+        eng_ws["D2"] = "Content"
+        eng_ws["D3"] = "Other content"
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            apply_rules(wb)
+
+        self.assertEqual(eng_ws["A3"].value, "eng_other_test")
+        self.assertEqual(eng_ws["B2"].value, "hi")
+        self.assertEqual(eng_ws["C3"].value, "eng")
+        self.assertEqual(ws["A3"].value, "por_other_test")
+        self.assertEqual(ws["B2"].value, "olá,👍,hi")
+        self.assertEqual(ws["B3"].value, "other")
+        self.assertEqual(ws["C3"].value, "por")
+        self.assertEqual(ws["D3"].value, "Other content")
+        self.assertEqual(output.getvalue(), "")
+
+    def test_stream_rules(self):
+        """
+        Should write the same values as applying the rules to the full workbook, when
+        reading and writing the workbooks a row at a time
+        """
+        wb = Workbook()
+        eng_ws = wb.active
+        eng_ws.title = "English master"
+        eng_ws.append(["Content title", "Automation", "Language", "Content"])
+        eng_ws.append(["eng test", "hi, 👍🏿", "eng", "Content"])
+        eng_ws.append(["eng_other", 5.0, None, "Other content"])
+        ws = wb.create_sheet(title="Portuguese")
+        ws.append(["Content title", "Automation", "Language", "Content"])
+        ws.append(["por_test", "olá", "por", "Conteúdo"])
+        ws.append(["por_other", None, None, None])
+        info = wb.create_sheet(title="ImportInfo")
+        info.append(["Sheet", "Type", "Country", "Number"])
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "content.xlsx")
+            wb.save(filename)
+            source = load_workbook(filename, read_only=True)
+            output = Workbook(write_only=True)
+            stream_rules(source, output)
+            source.close()
+            output.save(filename)
+            output = load_workbook(filename)
+
+        self.assertEqual(
+            output.sheetnames, ["English master", "Portuguese", "ImportInfo"]
+        )
+        self.assertEqual(
+            [[c.value for c in row] for row in output["English master"].iter_rows()],
+            [
+                ["Content title", "Automation", "Language", "Content"],
+                ["eng_test", "hi,👍", "eng", "Content"],
+                ["eng_other", "5", "eng", "Other content"],
+            ],
+        )
+        self.assertEqual(
+            [[c.value for c in row] for row in output["Portuguese"].iter_rows()],
+            [
+                ["Content title", "Automation", "Language", "Content"],
+                ["por_test", "olá,hi,👍", "por", "Conteúdo"],
+                ["por_other", "5", "por", "Other content"],
+            ],
+        )
+
+    def test_apply_rules_jobs(self):
+        """
+        Should give the same values and errors, in the same order, when processing the
+        language sheets in parallel processes
+        """
+        wb = Workbook()
+        eng_ws = wb.active
+        eng_ws.title = "English master"
+        eng_ws.append(["Content title", "Automation", "Language", "Content"])
+        eng_ws.append(["eng_test", "hi", "eng", "Content"])
+        eng_ws.append(["eng_other", "other", "eng", "Other content"])
+        for title in ("Portuguese", "Afrikaans", "isiZulu"):
+            ws = wb.create_sheet(title=title)
+            ws.append(["Content title", "Automation", "Language", "Content"])
+            ws.append([f"{title}_test", "olá,dup", title, f"{title} content"])
+            ws.append([f"{title}_other", "dup", None, None])
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            apply_rules(wb, jobs=2)
+
+        for title in ("Portuguese", "Afrikaans", "isiZulu"):
+            self.assertEqual(wb[title]["B2"].value, "olá,dup,hi")
+            self.assertEqual(wb[title]["B3"].value, "dup,other")
+            self.assertEqual(wb[title]["C3"].value, title)
+            self.assertEqual(wb[title]["D3"].value, "Other content")
+        self.assertEqual(
+            output.getvalue(),
+            "Duplicate keyword dup; sheet: Portuguese\n"
+            "Duplicate keyword dup; sheet: Afrikaans\n"
+            "Duplicate keyword dup; sheet: isiZulu\n",
+        )
+
+    def test_apply_rules_cache(self):
+        """
+        Should give the same values and errors when rows come from the build cache, and
+        reprocess rows when their English master values change
+        """
+
+        def workbook(english_keyword):
+            wb = Workbook()
+            eng_ws = wb.active
+            eng_ws.title = "English master"
+            eng_ws.append(["Content title", "Automation", "Language", "Content"])
+            eng_ws.append(["eng_test", english_keyword, "eng", "Content"])
+            eng_ws.append(["eng_other", "other", None, "Other content"])
+            ws = wb.create_sheet(title="Portuguese")
+            ws.append(["Content title", "Automation", "Language", "Content"])
+            ws.append(["por_test", "olá,dup,👍foo", "por", "Conteúdo"])
+            ws.append(["por_other", "dup", None, None])
+            return wb
+
+        def run(wb, cache):
+            output = io.StringIO()
+            with redirect_stdout(output):
+                apply_rules(wb, cache=cache)
+            values = [[c.value for c in row] for row in wb["Portuguese"].iter_rows()]
+            return values, output.getvalue()
+
+        expected = run(workbook("hi"), None)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.sqlite")
+            added = []
+            for _ in range(2):
+                cache = BuildCache(path, "test")
+                self.assertEqual(run(workbook("hi"), cache), expected)
+                added.append(len(cache.added))
+                cache.save()
+                cache.close()
+            self.assertEqual(added, [4, 0])
+
+            cache = BuildCache(path, "test")
+            values, _ = run(workbook("hello"), cache)
+            cache.close()
+        self.assertEqual(values[1][1], "olá,dup,👍foo,hello")
+        self.assertEqual(
+            expected[1],
+            "Invalid keyword, more than just emoji: 👍foo; sheet: Portuguese\n"
+            "Duplicate keyword dup; sheet: Portuguese\n",
+        )
+
+    def test_apply_rules_cache_rule_changed(self):
+        """
+        Should reprocess every row, instead of using the cached rows, when the source
+        of the rules changes
+        """
+        header = ["Content title", "Automation", "Language", "Content"]
+        rows = [["eng_test", "hi", "eng", "Content"], ["eng_other", "", "eng", "More"]]
+
+        def run(directory, transform):
+            source = (
+                "def change_content(row, state):\n"
+                "    content = state['columns']['content']\n"
+                f"    row[content] = row[content].{transform}()\n"
+                "\n"
+                "change_content.columns = ('content',)\n"
+                "change_content.english = ()\n"
+                "change_content.state = ()\n"
+                "change_content.cacheable = True\n"
+            )
+            module = types.ModuleType("rules")
+            module.__file__ = os.path.join(directory, "rules.py")
+            with open(module.__file__, "w") as f:
+                f.write(source)
+            exec(compile(source, module.__file__, "exec"), vars(module))
+            cache = BuildCache(
+                os.path.join(directory, "cache.sqlite"),
+                "test",
+                source_digest(module),
+            )
+            values = process_rows(
+                ColumnMap(header, "English master"),
+                [list(row) for row in rows],
+                [module.change_content],
+                cache=cache,
+            )
+            values = [row[3] for row in values]
+            cache.save()
+            cache.close()
+            return values, cache.hits
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(run(directory, "upper"), (["CONTENT", "MORE"], 0))
+            self.assertEqual(run(directory, "upper"), (["CONTENT", "MORE"], 2))
+            self.assertEqual(run(directory, "lower"), (["content", "more"], 0))
+
+    def test_check_workbook(self):
+        """
+        Should return the errors as records of where they are and which rule found
+        them, the same from the build cache, and stop after `max_errors`
+        """
+        wb = Workbook()
+        eng_ws = wb.active
+        eng_ws.title = "English master"
+        eng_ws.append(["Content title", "Automation", "Language", "Content"])
+        eng_ws.append(["eng_test", "hi", "eng", "Content"])
+        ws = wb.create_sheet(title="Portuguese")
+        ws.append(["Content title", "Automation", "Language", "Content"])
+        ws.append(["por_test", "olá,👍foo", "por", "a" * 4097])
+        ws.append(["por_test", "olá", None, None])
+        expected = [
+            ContentError(
+                "Portuguese",
+                2,
+                "B",
+                "normalise_keywords",
+                "Invalid keyword, more than just emoji: 👍foo; sheet: Portuguese",
+            ),
+            ContentError(
+                "Portuguese",
+                2,
+                "D",
+                "check_row_content_length",
+                "Content too long: por_test; sheet: Portuguese",
+            ),
+            ContentError(
+                "Portuguese",
+                3,
+                "B",
+                "check_duplicate_keywords",
+                "Duplicate keyword olá; sheet: Portuguese",
+            ),
+        ]
+
+        output = io.StringIO()
+        cache = MemoryCache()
+        with redirect_stdout(output):
+            self.assertEqual(check_workbook(wb, cache=cache), expected)
+            self.assertEqual(check_workbook(wb, cache=cache), expected)
+            self.assertEqual(check_workbook(wb, max_errors=2), expected[:2])
+        self.assertEqual(cache.hits, 3)
+        self.assertEqual(output.getvalue(), "")
+
+    def test_check_workbook_missing_english_content(self):
+        """
+        Should report content that can't be filled in from the English master, instead
+        of failing, for titles that aren't in it, and titles without English content
+        """
+        wb = Workbook()
+        eng_ws = wb.active
+        eng_ws.title = "English master"
+        eng_ws.append(["Content title", "Automation", "Language", "Content"])
+        eng_ws.append(["eng_test", "hi", "eng", "Content"])
+        eng_ws.append(["eng_empty", "empty", "eng", None])
+        ws = wb.create_sheet(title="Portuguese")
+        ws.append(["Content title", "Automation", "Language", "Content"])
+        ws.append(["por_test", "olá", "por", None])
+        ws.append(["por_empty", None, "por", None])
+        ws.append(["por_other", None, "por", None])
+        with redirect_stdout(io.StringIO()):
+            errors = check_workbook(wb)
+        self.assertEqual(
+            [(e.row, e.column, e.rule, e.message) for e in errors],
+            [
+                (
+                    3,
+                    "D",
+                    "fill_missing_content",
+                    "Missing english content for empty, sheet: Portuguese",
+                ),
+                (
+                    4,
+                    "A",
+                    "merge_english_keywords",
+                    "Missing english content other, sheet: Portuguese",
+                ),
+            ],
+        )
@@ -0,0 +1,77 @@
+from unittest import TestCase, mock
+
+import profiling
+from build_cache import MemoryCache
+from process_sheet import ColumnMap, fill_language, process_rows
+from profiling import Profiler, peak_rss
+
+
+class TestProfiling(TestCase):
+    def test_disabled(self):
+        """
+        Shouldn't record anything, or wrap the rules, unless it's enabled
+        """
+        profiler = Profiler()
+        with profiler.stage("load", 10):
+            pass
+        profiler.count("cache hits")
+        self.assertIs(profiler.timed_rule(fill_language), fill_language)
+        report = profiler.report()
+        self.assertEqual(report["stages"], [])
+        self.assertEqual(report["counters"], {})
+
+    def test_stages(self):
+        """
+        Should add up the time and rows of each stage, the time in each rule, and
+        report the cache hit rate
+        """
+        profiler = Profiler()
+        profiler.enable()
+        for rows in (2, 3):
+            with profiler.stage("rules", rows):
+                pass
+        with profiler.stage("parse") as stage:
+            stage.rows += 4
+        rule = profiler.timed_rule(fill_language)
+        self.assertEqual(rule.__name__, "fill_language")
+        self.assertEqual(rule.columns, fill_language.columns)
+        self.assertEqual(rule.state, fill_language.state)
+        columns = ColumnMap(["Content title", "Language"], "English master")
+        rows = list(process_rows(columns, [["a", "eng"], ["b", None]], [rule]))
+        self.assertEqual(rows, [["a", "eng"], ["b", "eng"]])
+        profiler.count("cache hits", 3)
+        profiler.count("cache misses", 1)
+
+        report = profiler.report()
+        self.assertEqual(
+            [(s["name"], s["calls"], s["rows"]) for s in report["stages"]],
+            [("rules", 2, 5), ("parse", 1, 4)],
+        )
+        self.assertEqual(list(report["rules"]), ["fill_language"])
+        self.assertEqual(report["counters"]["cache hit rate"], 0.75)
+
+    def test_cache_lookups(self):
+        """
+        Should count the hits and misses, including those merged from other caches
+        """
+        cache = MemoryCache()
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        worker = MemoryCache()
+        worker.get("b")
+        cache.merge(**worker.results())
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_peak_rss(self):
+        """
+        Should return the peak RSS in bytes, which macOS reports in bytes and Linux in
+        kilobytes
+        """
+        usage = mock.Mock(ru_maxrss=2048)
+        with mock.patch.object(profiling, "resource") as resource:
+            resource.getrusage.return_value = usage
+            with mock.patch("sys.platform", "linux"):
+                self.assertEqual(peak_rss(), 2048 * 1024)
+            with mock.patch("sys.platform", "darwin"):
+                self.assertEqual(peak_rss(), 2048)
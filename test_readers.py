@@ -0,0 +1,106 @@
+import datetime
+import os
+import re
+import tempfile
+import zipfile
+from unittest import TestCase
+
+from openpyxl import Workbook
+
+from readers import get_reader, open_workbook
+
+
+class TestReaders(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "content.xlsx")
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "English master"
+        ws.append(["Content title", "Content", "Language", "Automation"])
+        ws.append(["eng_welcome", "Welcome ✅", "eng", 5.0])
+        ws.append(["eng_menu", None, None, 3])
+        ws["B6"] = "After a gap"
+        ws["F6"] = True
+        ws["A7"] = "=A2&C2"
+        ws["A8"] = datetime.datetime(2021, 3, 4, 5, 6)
+        wb.create_sheet("Empty")
+        info = wb.create_sheet("ImportInfo")
+        info.append(["Sheet", "Type", "Country", "Number"])
+        info.append(["English master", "Client", "Zambia", "=27600109000"])
+        wb.save(self.filename)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def rows(self, reader, **kwargs):
+        wb = open_workbook(self.filename, reader)
+        rows = {
+            sheet.title: [
+                tuple(row) for row in sheet.iter_rows(values_only=True, **kwargs)
+            ]
+            for sheet in wb
+        }
+        wb.close()
+        return rows
+
+    def test_xlsx_reader(self):
+        """
+        Should read the same values as openpyxl
+        """
+        for kwargs in ({}, {"min_row": 2}, {"min_row": 2, "max_col": 3}):
+            self.assertEqual(
+                self.rows("xlsx", **kwargs), self.rows("openpyxl", **kwargs)
+            )
+        rows = self.rows("xlsx")
+        self.assertEqual(list(rows), ["English master", "Empty", "ImportInfo"])
+        self.assertEqual(
+            rows["English master"][1][:4], ("eng_welcome", "Welcome ✅", "eng", 5.0)
+        )
+        self.assertEqual(rows["English master"][3], (None,) * 6)
+        self.assertEqual(rows["English master"][6][0], "=A2&C2")
+
+    def test_xlsx_without_dimension(self):
+        """
+        Should pad the rows to the width of the header, if the sheet doesn't say how
+        big it is
+        """
+        filename = os.path.join(self.directory.name, "no_dimension.xlsx")
+        with zipfile.ZipFile(self.filename) as source:
+            with zipfile.ZipFile(filename, "w") as target:
+                for name in source.namelist():
+                    data = source.read(name)
+                    if name.startswith("xl/worksheets/"):
+                        data = re.sub(rb"<dimension [^>]*/>", b"", data)
+                    target.writestr(name, data)
+        wb = open_workbook(filename)
+        rows = list(wb["English master"].iter_rows())
+        self.assertEqual(
+            rows[0], ("Content title", "Content", "Language", "Automation")
+        )
+        self.assertEqual(rows[2], ("eng_menu", None, None, 3))
+        self.assertEqual(rows[3], (None,) * 4)
+        self.assertEqual(rows[5], (None, "After a gap", None, None, None, True))
+        self.assertEqual(rows[6], ("=A2&C2", None, None, None))
+        self.assertEqual(
+            list(wb["English master"].iter_rows(min_row=7, max_col=2)),
+            [("=A2&C2", None), (datetime.datetime(2021, 3, 4, 5, 6), None)],
+        )
+        wb.close()
+
+    def test_unknown_reader(self):
+        with self.assertRaises(ValueError):
+            open_workbook(self.filename, "ods")
+
+    def test_get_reader(self):
+        """
+        Should default to xlsx for workbooks and csv for directories, and only read
+        directories as CSV bundles
+        """
+        self.assertEqual(get_reader(self.filename), "xlsx")
+        self.assertEqual(get_reader(self.filename, "store"), "store")
+        self.assertEqual(get_reader(self.directory.name), "csv")
+        self.assertEqual(get_reader(self.directory.name, "csv"), "csv")
+        for reader in ("store", "xlsx"):
+            with self.assertRaises(ValueError):
+                open_workbook(self.directory.name, reader)
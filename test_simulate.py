@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from convert_to_json import parse_row
+from simulate import Simulator, simulate_file
+
+
+class TestSimulate(TestCase):
+    def setUp(self):
+        self.entries = [
+            parse_row(("eng_menu", "Menu", "eng", "Menu, 0", None)),
+            parse_row(("eng_help", "Help", "eng", "help, 0", None)),
+            parse_row(("eng_fallback", "Sorry", "eng", "CATCHALL", None)),
+            parse_row(("eng_language", "Languages", "eng", None, "english")),
+            parse_row(("por_menu", "Menu", "por", "menu", "portugues")),
+            parse_row(("zul_menu", "Menu", "zul", "menu", None)),
+        ]
+
+    def test_match(self):
+        """
+        Should match keywords case insensitively for the contact's language, and only
+        fall back to the catch alls if no keyword matches
+        """
+        simulator = Simulator(self.entries)
+
+        def questions(language, text):
+            return simulator.questions(simulator.match(language, text))
+
+        self.assertEqual(questions("ENG", " MENU "), ["eng_menu"])
+        self.assertEqual(questions(None, "menu"), ["eng_menu"])
+        self.assertEqual(questions("POR", "menu"), ["por_menu"])
+        self.assertEqual(questions("POR", "english"), ["eng_language"])
+        self.assertEqual(questions("ENG", "hello"), ["eng_fallback"])
+        self.assertEqual(questions("POR", "hello"), [])
+
+    def test_report(self):
+        """
+        Should report ambiguous keywords for each language, unreachable automators,
+        and the content that the replayed messages matched
+        """
+        messages = [
+            {"text": "menu", "language": "ENG"},
+            {"text": "0", "language": None},
+            {"text": "hello", "language": "POR"},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "content_Zambia_Client.json")
+            with open(filename, "w") as f:
+                json.dump({"data": self.entries}, f)
+            log = os.path.join(directory, "messages.jsonl")
+            with open(log, "w") as f:
+                f.write("\n".join(json.dumps(m) for m in messages))
+            report = simulate_file(filename, log)
+
+        self.assertEqual(
+            [(a["language"], a["keyword"]) for a in report["ambiguous"]],
+            [("ENG", "0"), (None, "0")],
+        )
+        self.assertEqual(report["ambiguous"][0]["questions"], ["eng_help", "eng_menu"])
+        self.assertEqual(
+            [(u["name"], u["reason"]) for u in report["unreachable"]],
+            [("zul-menu", "no automator sets the contact language to ZUL")],
+        )
+        replay = report["replay"]
+        self.assertEqual((replay["messages"], replay["unmatched"]), (3, 1))
+        self.assertEqual(replay["ambiguous"], 1)
+        self.assertEqual(replay["matched"], {"eng_menu": 2, "eng_help": 1})
+
+    def test_synthetic_messages(self):
+        """
+        Should generate the same random messages for the same seed
+        """
+        simulator = Simulator(self.entries)
+        messages = simulator.synthetic_messages(1000)
+        self.assertEqual(len(messages), 1000)
+        self.assertEqual(messages, simulator.synthetic_messages(1000))
+        self.assertEqual(simulator.replay(messages)["messages"], 1000)
@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+from turn_diff import diff_entries, index_live
+
+
+def automator(name, keyword):
+    return {
+        "config": {"data": {"triggers": [keyword]}, "version": "0.2.0"},
+        "enabled": True,
+        "is_deleted": False,
+        "name": name,
+    }
+
+
+def entry(question, answer, automators=()):
+    return {
+        "answer": answer,
+        "attachment_media_object": None,
+        "attachment_media_type": None,
+        "attachment_mime_type": None,
+        "attachment_uri": None,
+        "automators": list(automators),
+        "is_deleted": False,
+        "language": "eng",
+        "question": question,
+    }
+
+
+class TestTurnDiff(TestCase):
+    def test_diff_entries(self):
+        """
+        Should only return the added, changed, and deleted entries, ignoring the extra
+        fields and automator order of the export
+        """
+        live = [
+            {
+                **entry(
+                    "eng_same",
+                    "Same",
+                    [automator("b", "2"), automator("a", "1")],
+                ),
+                "id": 1,
+                "inserted_at": "2021-01-01",
+            },
+            entry("eng_changed", "Old", [automator("old", "x"), automator("c", "3")]),
+            entry("eng_removed", "Removed", [automator("d", "4")]),
+            {**entry("eng_deleted", "Deleted"), "is_deleted": True},
+        ]
+        new = [
+            entry("eng_same", "Same", [automator("a", "1"), automator("b", "2")]),
+            entry("eng_changed", "New", [automator("c", "3")]),
+            entry("eng_added", "Added"),
+            entry("eng_deleted", "Deleted"),
+        ]
+        changes = list(diff_entries(new, index_live(live)))
+        self.assertEqual(
+            [(change, e["question"]) for change, e in changes],
+            [
+                ("changed", "eng_changed"),
+                ("added", "eng_added"),
+                ("added", "eng_deleted"),
+                ("deleted", "eng_removed"),
+            ],
+        )
+        changed = changes[0][1]
+        self.assertEqual(changed["answer"], "New")
+        self.assertEqual(
+            [(a["name"], a["is_deleted"]) for a in changed["automators"]],
+            [("c", False), ("old", True)],
+        )
+        deleted = changes[3][1]
+        self.assertTrue(deleted["is_deleted"])
+        self.assertEqual(
+            [(a["name"], a["is_deleted"]) for a in deleted["automators"]],
+            [("d", True)],
+        )
+
+    def test_no_changes(self):
+        """
+        Should return nothing if the content is the same as the live content
+        """
+        entries = [entry("eng_a", "A", [automator("a", "1")]), entry("eng_b", "B")]
+        self.assertEqual(list(diff_entries(entries, index_live(entries))), [])
@@ -0,0 +1,99 @@
+import json
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import TestCase
+
+from turn_export import ExportParser, get_media_entries
+
+EXPORT = {
+    "data": [
+        {"question": "eng_welcome", "attachment_media_object": {"id": "1"}},
+        {"question": "eng_menu", "attachment_media_object": None},
+        {"question": "por_welcome", "attachment_media_object": {"id": "2"}},
+    ],
+    "schema_version": "0.1",
+}
+
+
+class ExportHandler(BaseHTTPRequestHandler):
+    """
+    A local stand in for the Turn export API
+    """
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(EXPORT, indent=2).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestTurnExport(TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), ExportHandler)
+        self.server.requests = []
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/export"
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.01,), daemon=True
+        ).start()
+        self.cache = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.cache.cleanup()
+
+    def get(self, **kwargs):
+        return get_media_entries(
+            "token", url=self.url, cache_directory=self.cache.name, **kwargs
+        )
+
+    def test_export_parser(self):
+        """
+        Should yield the same entries no matter how the response is split into chunks
+        """
+        text = json.dumps({"meta": {"a": [1, "]}"]}, "count": 12345, **EXPORT})
+        for size in (1, 7, 100, len(text)):
+            chunks = [text[i : i + size] for i in range(0, len(text), size)]
+            self.assertEqual(list(ExportParser(chunks)), EXPORT["data"])
+        self.assertEqual(list(ExportParser(['{"data": [], "a": 1}'])), [])
+        with self.assertRaises(ValueError):
+            list(ExportParser(['{"data": [{"question": "eng_welcome"}']))
+
+    def test_media_snapshot(self):
+        """
+        Should check for changes with a conditional request every time, unless the
+        snapshot is still within the `ttl`
+        """
+        entries = [EXPORT["data"][0], EXPORT["data"][2]]
+        self.assertEqual(self.get(), entries)
+        self.assertEqual(self.server.requests[0]["Authorization"], "Bearer token")
+        self.assertNotIn("If-None-Match", self.server.requests[0])
+
+        self.assertEqual(self.get(), entries)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.requests[1]["If-None-Match"], '"v1"')
+
+        self.assertEqual(self.get(ttl=60 * 60), entries)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_offline(self):
+        """
+        Should only use the snapshot, and error if there isn't one
+        """
+        with self.assertRaises(Exception):
+            self.get(offline=True)
+        entries = self.get()
+        self.assertEqual(self.get(offline=True), entries)
+        self.assertEqual(len(self.server.requests), 1)
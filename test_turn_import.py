@@ -0,0 +1,129 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import TestCase, mock
+
+from turn_import import get_token, split_import, upload
+
+DATA = [{"question": f"eng_{i}", "content": "x" * i} for i in range(20)]
+
+
+class ImportHandler(BaseHTTPRequestHandler):
+    """
+    A local stand in for the Turn import API, that rate limits the first request
+    """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.encodings.add(self.headers.get("Content-Encoding"))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        with self.server.lock:
+            self.server.attempts += 1
+            limited = self.server.attempts == 1
+            if not limited:
+                self.server.imports.append(
+                    (self.headers["Authorization"], json.loads(body))
+                )
+        if limited:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestTurnImport(TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), ImportHandler)
+        self.server.lock = threading.Lock()
+        self.server.attempts = 0
+        self.server.imports = []
+        self.server.encodings = set()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/import"
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.01,), daemon=True
+        ).start()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def test_split_import(self):
+        """
+        Should split the entries into imports no bigger than the limit, except for
+        single entries that are bigger than it
+        """
+        bodies = list(split_import(DATA, 200))
+        self.assertGreater(len(bodies), 1)
+        entries = []
+        for body in bodies:
+            import_ = json.loads(body)
+            self.assertEqual(import_["schema_version"], "0.1")
+            self.assertLessEqual(len(body), max(200, len(json.dumps(import_))))
+            entries.extend(import_["data"])
+        self.assertEqual(entries, DATA)
+        self.assertEqual(len(list(split_import(DATA, 1))), len(DATA))
+        self.assertEqual(list(split_import([])), [])
+
+    def test_get_token(self):
+        """
+        Should get the token for the file's Turn number from the environment
+        """
+        with mock.patch.dict(os.environ, {"TURN_TOKEN_ZAMBIA_WHO": "abc"}):
+            self.assertEqual(get_token("out/content_zambia_who.json"), "abc")
+            self.assertEqual(get_token("content_zambia_m2m.json", "def"), "def")
+
+    def test_upload(self):
+        """
+        Should upload all the files, retrying when rate limited, and return the results
+        in the order of the files
+        """
+        filenames = []
+        for name in ("zambia_who", "zambia_m2m", "malawi_who"):
+            filename = os.path.join(self.directory.name, f"content_{name}.json")
+            with open(filename, "w") as f:
+                json.dump({"data": DATA, "schema_version": "0.1"}, f)
+            filenames.append(filename)
+
+        results = list(upload(filenames, "token", self.url, jobs=2, max_bytes=300))
+        self.assertEqual([r["file"] for r in results], filenames)
+        imports = sum(r["imports"] for r in results)
+        self.assertEqual(len(self.server.imports), imports)
+        self.assertEqual(self.server.attempts, imports + 1)
+        self.assertEqual(
+            sorted(e["question"] for _, i in self.server.imports for e in i["data"]),
+            sorted(e["question"] for e in DATA * 3),
+        )
+        self.assertEqual({a for a, _ in self.server.imports}, {"Bearer token"})
+        self.assertEqual(self.server.encodings, {None})
+
+    def test_upload_gzip(self):
+        """
+        Should only compress the imports when asked to
+        """
+        filename = os.path.join(self.directory.name, "content_zambia_who.json")
+        with open(filename, "w") as f:
+            json.dump({"data": DATA, "schema_version": "0.1"}, f)
+
+        results = list(upload([filename], "token", self.url, compress=True))
+        self.assertEqual(results[0]["imports"], 1)
+        self.assertEqual(self.server.imports[0][1]["data"], DATA)
+        self.assertEqual(self.server.encodings, {"gzip"})
+
+    def test_missing_token(self):
+        """
+        Should error before uploading anything if a file has no token
+        """
+        with self.assertRaises(Exception):
+            list(upload(["content_nowhere_who.json"], url=self.url))
+        self.assertEqual(self.server.attempts, 0)
@@ -0,0 +1,153 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from csv_bundle import sheet_filename
+from watch import ContentWatcher
+
+HEADER = ["Content title", "Content", "Language", "Automation", "Language switch"]
+
+
+class TestWatch(TestCase):
+    def write_sheet(self, title, rows):
+        path = os.path.join(self.directory, "content", sheet_filename(title))
+        with open(path, "w", newline="") as f:
+            csv.writer(f).writerows(rows)
+        # Make sure that the change is seen, even within the timestamp resolution
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def rebuild(self):
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            written = self.watcher.rebuild()
+        return written, output.getvalue()
+
+    def read_json(self, name):
+        with open(os.path.join(self.directory, name)) as f:
+            return [e["answer"] for e in json.load(f)["data"]]
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = temporary.name
+        os.mkdir(os.path.join(self.directory, "content"))
+        self.write_sheet(
+            "ImportInfo",
+            [
+                ["Sheet", "Type", "Country", "Number"],
+                ["English master", "Client", "Zambia", "260"],
+                ["Bemba (Zambia)", "Client", "Zambia", "260"],
+                ["English master", "Client", "Mozambique", "258"],
+            ],
+        )
+        self.write_sheet(
+            "English master",
+            [HEADER, ["eng_menu", "Menu", "eng", "menu", ""], ["eng_help", "Help"]],
+        )
+        self.write_sheet(
+            "Bemba (Zambia)",
+            [HEADER, ["bem_menu", "", "bem", "", ""], ["bem_help", "Ukwafwa"]],
+        )
+        self.watcher = ContentWatcher(
+            os.path.join(self.directory, "content"), output=self.directory
+        )
+
+    def test_rebuild(self):
+        """
+        Should only process the sheets that changed, and the sheets that use the
+        English master if it changed, and only write the files that they're in
+        """
+        written, _ = self.rebuild()
+        self.assertEqual(
+            written, ["content_Zambia_Client.json", "content_Mozambique_Client.json"]
+        )
+        self.assertEqual(
+            self.read_json("content_Zambia_Client.json"),
+            ["Menu", "Help", "Menu", "Ukwafwa"],
+        )
+        self.assertEqual(self.rebuild()[0], [])
+
+        self.write_sheet(
+            "Bemba (Zambia)",
+            [HEADER, ["bem_menu", "Menyu", "bem", "", ""], ["bem_help", "Ukwafwa"]],
+        )
+        self.assertEqual(self.rebuild()[0], ["content_Zambia_Client.json"])
+        self.assertEqual(
+            self.read_json("content_Zambia_Client.json"),
+            ["Menu", "Help", "Menyu", "Ukwafwa"],
+        )
+
+        self.write_sheet(
+            "English master",
+            [
+                HEADER,
+                ["eng_menu", "Main menu", "eng", "menu", ""],
+                ["eng_help", "Help"],
+            ],
+        )
+        written, output = self.rebuild()
+        self.assertIn("processed 2 sheets", output)
+        self.assertEqual(len(written), 2)
+
+    def test_errors(self):
+        """
+        Should not write anything while there are errors, and write the files that
+        changed in the meantime once they're fixed
+        """
+        self.rebuild()
+        self.write_sheet(
+            "Bemba (Zambia)",
+            [
+                HEADER,
+                ["bem_menu", "Menyu", "bem", "1,1", ""],
+                ["bem_help", "", "", "1"],
+            ],
+        )
+        written, output = self.rebuild()
+        self.assertEqual(written, [])
+        self.assertIn("Duplicate keyword 1; sheet: Bemba (Zambia)", output)
+        self.assertIn("1 errors, not writing", output)
+
+        self.write_sheet(
+            "Bemba (Zambia)",
+            [HEADER, ["bem_menu", "Menyu", "bem", "1", ""], ["bem_help", "", "", "2"]],
+        )
+        self.assertEqual(self.rebuild()[0], ["content_Zambia_Client.json"])
+        self.assertEqual(
+            self.read_json("content_Zambia_Client.json"),
+            ["Menu", "Help", "Menyu", "Help"],
+        )
+
+    def test_prune(self):
+        """
+        Should only keep the cached results for the current rows, and remove the files
+        of Turn numbers that are taken out of ImportInfo
+        """
+        self.rebuild()
+        for i in range(5):
+            self.write_sheet(
+                "Bemba (Zambia)",
+                [HEADER, ["bem_menu", f"Menyu {i}", "bem", "", ""], ["bem_help", "A"]],
+            )
+            self.rebuild()
+        self.assertEqual(len(self.watcher.rule_cache.entries), 4)
+        self.assertEqual(len(self.watcher.parse_cache.entries), 4)
+
+        self.write_sheet(
+            "ImportInfo",
+            [
+                ["Sheet", "Type", "Country", "Number"],
+                ["English master", "Client", "Zambia", "260"],
+            ],
+        )
+        written, output = self.rebuild()
+        self.assertEqual(written, ["content_Zambia_Client.json"])
+        self.assertIn("removed: content_Mozambique_Client.json", output)
+        self.assertEqual(
+            sorted(n for n in os.listdir(self.directory) if n.endswith(".json")),
+            ["content_Zambia_Client.json"],
+        )
@@ -0,0 +1,153 @@
+import glob
+import json
+import os
+
+import turn_export
+import turn_import
+
+# The fields of an import entry that are compared with the live content
+ENTRY_FIELDS = (
+    "answer",
+    "attachment_media_object",
+    "attachment_media_type",
+    "attachment_mime_type",
+    "attachment_uri",
+    "language",
+)
+# The fields of an automator that are compared with the live automators
+AUTOMATOR_FIELDS = ("config", "enabled", "name")
+DELTA_DIRECTORY = "delta"
+
+
+def live_automators(entry):
+    """
+    Returns the automators of `entry` that aren't deleted, by name
+    """
+    return {
+        automator["name"]: automator
+        for automator in entry.get("automators") or []
+        if not automator.get("is_deleted")
+    }
+
+
+def comparable(entry):
+    """
+    Returns the parts of `entry` that we generate, in a form that can be compared
+    between the generated and live content
+    """
+    automators = sorted(
+        json.dumps([automator.get(field) for field in AUTOMATOR_FIELDS], sort_keys=True)
+        for automator in live_automators(entry).values()
+    )
+    fields = json.dumps([entry.get(field) for field in ENTRY_FIELDS], sort_keys=True)
+    return fields, tuple(automators)
+
+
+def deleted_automators(new, live):
+    """
+    Returns the `live` automators that are no longer in the `new` entry, marked as
+    deleted
+    """
+    names = {automator["name"] for automator in new.get("automators") or []}
+    return [
+        {
+            **{field: automator.get(field) for field in AUTOMATOR_FIELDS},
+            "is_deleted": True,
+        }
+        for name, automator in live_automators(live).items()
+        if name not in names
+    ]
+
+
+def index_live(entries):
+    """
+    Indexes the live export `entries` by question, skipping deleted entries. Only the
+    comparable parts, and the automators, are kept, so that the whole export doesn't
+    have to be in memory.
+    """
+    index = {}
+    for entry in entries:
+        if entry.get("is_deleted"):
+            continue
+        index[entry["question"]] = {
+            "comparable": comparable(entry),
+            "entry": {
+                "question": entry["question"],
+                "language": entry.get("language"),
+                "automators": list(live_automators(entry).values()),
+            },
+        }
+    return index
+
+
+def diff_entries(entries, live):
+    """
+    Yields `(change, entry)` for each of the generated `entries` that were added or
+    changed compared to the `live` index, and for each of the live entries that are no
+    longer generated, where `change` is one of "added", "changed" or "deleted".
+
+    Changed entries include their removed automators, marked as deleted, and deleted
+    entries are marked as deleted along with their automators.
+    """
+    seen = set()
+    for entry in entries:
+        question = entry["question"]
+        seen.add(question)
+        current = live.get(question)
+        if current is None:
+            yield "added", entry
+        elif comparable(entry) != current["comparable"]:
+            removed = deleted_automators(entry, current["entry"])
+            yield "changed", {**entry, "automators": entry["automators"] + removed}
+    for question, current in live.items():
+        if question not in seen:
+            entry = current["entry"]
+            yield "deleted", {
+                **entry,
+                "automators": deleted_automators({}, entry),
+                "is_deleted": True,
+            }
+
+
+def diff_file(filename, token, output, url=turn_export.EXPORT_URL, compact=False):
+    """
+    Writes the entries of the import file `filename` that differ from the live content
+    of the line that `token` is for, to `output`. Returns a summary of the changes.
+    """
+    live = index_live(turn_export.export_entries(token, url))
+    with open(filename) as f:
+        entries = json.load(f)["data"]
+    summary = {"file": filename, "added": 0, "changed": 0, "deleted": 0}
+    data = []
+    for change, entry in diff_entries(entries, live):
+        summary[change] += 1
+        data.append(entry)
+    summary["unchanged"] = len(entries) - summary["added"] - summary["changed"]
+    with open(output, "w") as f:
+        if compact:
+            json.dump({"data": data, "schema_version": "0.1"}, f, separators=(",", ":"))
+        else:
+            json.dump({"data": data, "schema_version": "0.1"}, f, indent=4)
+    summary["bytes"] = os.path.getsize(filename)
+    summary["delta_bytes"] = os.path.getsize(output)
+    return summary
+
+
+def main(args):
+    filenames = args.files or sorted(glob.glob("content_*.json"))
+    tokens = {
+        filename: turn_import.get_token(filename, args.token) for filename in filenames
+    }
+    missing = [filename for filename, token in tokens.items() if not token]
+    if missing:
+        raise Exception(f"No token for {', '.join(missing)}")
+    os.makedirs(args.output_directory, exist_ok=True)
+    for filename in filenames:
+        output = os.path.join(args.output_directory, os.path.basename(filename))
+        summary = diff_file(filename, tokens[filename], output, compact=args.compact)
+        print(
+            f"{filename}: {summary['added']} added, {summary['changed']} changed, "
+            f"{summary['deleted']} deleted, {summary['unchanged']} unchanged, "
+            f"{summary['bytes'] / 1024:.0f}KB -> {summary['delta_bytes'] / 1024:.0f}KB "
+            f"in {output}"
+        )
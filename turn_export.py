@@ -0,0 +1,204 @@
+import codecs
+import hashlib
+import json
+import os
+import time
+
+import requests
+
+EXPORT_URL = "https://whatsapp.turn.io/v1/export"
+CACHE_DIRECTORY = ".turn_cache"
+# How long, in seconds, to use a media snapshot before checking for changes. By
+# default it's checked every time, which only costs a 304 response if nothing changed.
+CACHE_TTL = 0
+CHUNK_SIZE = 64 * 1024
+
+
+class ExportParser:
+    """
+    Parses the `{"data": [...], ...}` export response from an iterable of text chunks,
+    yielding the entries of `data` one at a time, so that the whole export never has to
+    be in memory
+    """
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text = ""
+        self.position = 0
+        self.finished = False
+
+    def fill(self):
+        """
+        Reads the next chunk into the buffer, dropping what has already been parsed.
+        Returns False if there are no more chunks.
+        """
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.finished = True
+            return False
+        self.text = self.text[self.position :] + chunk
+        self.position = 0
+        return True
+
+    def next_character(self):
+        """
+        Skips any whitespace, and returns the next character without consuming it
+        """
+        while True:
+            while self.position < len(self.text) and self.text[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.text):
+                return self.text[self.position]
+            if not self.fill():
+                raise ValueError("Unexpected end of export")
+
+    def expect(self, characters):
+        character = self.next_character()
+        if character not in characters:
+            raise ValueError(
+                f"Expected one of {characters!r} in export, got {character!r}"
+            )
+        self.position += 1
+        return character
+
+    def value(self):
+        """
+        Decodes the next JSON value, reading more chunks until it's complete
+        """
+        self.next_character()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.text, self.position)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number at the end of the buffer might continue in the next chunk
+            if end == len(self.text) and not self.finished and self.fill():
+                continue
+            self.position = end
+            return value
+
+    def __iter__(self):
+        self.expect("{")
+        if self.next_character() == "}":
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            if key == "data":
+                self.expect("[")
+                if self.next_character() == "]":
+                    self.position += 1
+                else:
+                    while True:
+                        yield self.value()
+                        if self.expect(",]") == "]":
+                            break
+            else:
+                self.value()
+            if self.expect(",}") == "}":
+                return
+
+
+def iter_export(response):
+    """
+    Yields each of the entries of the export `response`, as it's downloaded
+    """
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")()
+    chunks = (decoder.decode(c) for c in response.iter_content(CHUNK_SIZE))
+    yield from ExportParser(chunks)
+
+
+def export_entries(token, url=EXPORT_URL, session=requests):
+    """
+    Yields all of the content entries of the line that `token` is for, as the export is
+    downloaded
+    """
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.v1+json",
+    }
+    with session.get(url, headers=headers, stream=True) as response:
+        response.raise_for_status()
+        yield from iter_export(response)
+
+
+def snapshot_path(token, url, cache_directory):
+    """
+    Returns the path of the media snapshot for the line that `token` is for. The token
+    is hashed, so that it isn't stored on disk.
+    """
+    key = hashlib.sha256(f"{url} {token}".encode()).hexdigest()[:16]
+    return os.path.join(cache_directory, f"media_{key}.json")
+
+
+def load_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_snapshot(path, snapshot):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(snapshot, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def get_media_entries(
+    token,
+    url=EXPORT_URL,
+    cache_directory=CACHE_DIRECTORY,
+    ttl=CACHE_TTL,
+    offline=False,
+    session=requests,
+):
+    """
+    Returns the exported content entries that have media attached, for the line that
+    `token` is for.
+
+    The entries are kept in a snapshot file in `cache_directory`. The export is
+    requested with the snapshot's ETag and Last-Modified, so that if nothing has
+    changed, Turn can respond with a 304 instead of the whole export. If `ttl` is set,
+    the snapshot is used without checking for changes for that many seconds. If
+    `offline` is set, only the snapshot is used.
+    """
+    path = snapshot_path(token, url, cache_directory)
+    snapshot = load_snapshot(path)
+    if offline:
+        if snapshot is None:
+            raise Exception(f"No media snapshot at {path}, run once without --offline")
+        return snapshot["entries"]
+    if snapshot is not None and time.time() - snapshot["fetched_at"] < ttl:
+        return snapshot["entries"]
+
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.v1+json",
+    }
+    if snapshot is not None and snapshot.get("etag"):
+        headers["If-None-Match"] = snapshot["etag"]
+    if snapshot is not None and snapshot.get("last_modified"):
+        headers["If-Modified-Since"] = snapshot["last_modified"]
+    with session.get(url, headers=headers, stream=True) as response:
+        if snapshot is not None and response.status_code == 304:
+            snapshot["fetched_at"] = time.time()
+        else:
+            response.raise_for_status()
+            snapshot = {
+                "fetched_at": time.time(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "entries": [
+                    entry
+                    for entry in iter_export(response)
+                    if entry["attachment_media_object"]
+                ],
+            }
+    save_snapshot(path, snapshot)
+    return snapshot["entries"]
@@ -0,0 +1,162 @@
+import glob
+import gzip
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+IMPORT_URL = "https://whatsapp.turn.io/v1/import"
+# Imports bigger than this are split into several imports
+MAX_IMPORT_BYTES = 4 * 1024 * 1024
+RETRIES = 5
+# Seconds to wait before the first retry, doubled for each retry after that
+BACKOFF = 1
+
+
+def get_token(filename, default=None):
+    """
+    Returns the token for the Turn number that the `content_{country}_{type}.json` file
+    is for, from the TURN_TOKEN_{COUNTRY}_{TYPE} environment variable, or `default`
+    """
+    name = os.path.basename(filename)
+    name = name.replace("content_", "", 1).rsplit(".", 1)[0]
+    return os.environ.get(f"TURN_TOKEN_{name.upper()}", default)
+
+
+def split_import(data, max_bytes=MAX_IMPORT_BYTES):
+    """
+    Yields the import `data` entries as compact JSON import bodies of at most
+    `max_bytes` each. An entry that is bigger than that on its own gets its own import.
+    """
+    prefix, suffix = b'{"data":[', b'],"schema_version":"0.1"}'
+    entries = []
+    size = len(prefix) + len(suffix)
+    for entry in data:
+        entry = json.dumps(entry, separators=(",", ":")).encode()
+        if entries and size + len(entry) + 1 > max_bytes:
+            yield prefix + b",".join(entries) + suffix
+            entries = []
+            size = len(prefix) + len(suffix)
+        entries.append(entry)
+        size += len(entry) + 1
+    if entries:
+        yield prefix + b",".join(entries) + suffix
+
+
+def post_import(session, url, token, body, compress=False, retries=RETRIES):
+    """
+    Posts the import `body`, gzip compressed if `compress` is set, retrying with an
+    exponential backoff on rate limiting, server errors and connection errors
+    """
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+        "Accept": "application/vnd.v1+json",
+    }
+    if compress:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    for attempt in range(retries + 1):
+        delay = BACKOFF * 2**attempt
+        try:
+            response = session.post(url, data=body, headers=headers)
+        except requests.ConnectionError:
+            if attempt == retries:
+                raise
+        else:
+            if response.status_code != 429 and response.status_code < 500:
+                break
+            if attempt == retries:
+                break
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = int(retry_after)
+        time.sleep(delay)
+    response.raise_for_status()
+    return response
+
+
+def upload_file(
+    session, filename, token, url=IMPORT_URL, max_bytes=MAX_IMPORT_BYTES, compress=False
+):
+    """
+    Uploads the import file, split into imports of at most `max_bytes`. Returns the
+    number of imports, bytes and seconds that it took.
+    """
+    start = time.monotonic()
+    with open(filename) as f:
+        data = json.load(f)["data"]
+    imports = 0
+    size = 0
+    for body in split_import(data, max_bytes):
+        post_import(session, url, token, body, compress)
+        imports += 1
+        size += len(body)
+    return {
+        "file": filename,
+        "imports": imports,
+        "bytes": size,
+        "seconds": time.monotonic() - start,
+    }
+
+
+def upload(
+    filenames,
+    token=None,
+    url=IMPORT_URL,
+    jobs=4,
+    max_bytes=MAX_IMPORT_BYTES,
+    compress=False,
+):
+    """
+    Uploads all of the import files at the same time, in `jobs` threads sharing a pool
+    of connections. Yields the result of each upload, in the order of `filenames`.
+    """
+    tokens = {filename: get_token(filename, token) for filename in filenames}
+    missing = [filename for filename, token in tokens.items() if not token]
+    if missing:
+        raise Exception(f"No token for {', '.join(missing)}")
+
+    with requests.Session() as session:
+        adapter = HTTPAdapter(pool_connections=jobs, pool_maxsize=jobs)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        with ThreadPoolExecutor(jobs) as executor:
+            futures = [
+                executor.submit(
+                    upload_file,
+                    session,
+                    filename,
+                    tokens[filename],
+                    url,
+                    max_bytes,
+                    compress,
+                )
+                for filename in filenames
+            ]
+            for future in futures:
+                yield future.result()
+
+
+def main(args):
+    filenames = args.files or sorted(glob.glob("content_*.json"))
+    start = time.monotonic()
+    total = 0
+    for result in upload(
+        filenames,
+        token=args.token,
+        jobs=args.jobs,
+        max_bytes=args.max_bytes,
+        compress=args.gzip,
+    ):
+        total += result["bytes"]
+        print(
+            f"{result['file']}: {result['imports']} imports, "
+            f"{result['bytes'] / 1024:.0f}KB in {result['seconds']:.2f}s "
+            f"({result['bytes'] / 1024 / result['seconds']:.0f}KB/s)"
+        )
+    seconds = time.monotonic() - start
+    print(f"Uploaded {len(filenames)} files, {total / 1024:.0f}KB in {seconds:.2f}s")
@@ -0,0 +1,360 @@
+import argparse
+import os
+import time
+
+import convert_to_json
+import process_sheet
+import readers
+import turn_export
+from build_cache import MemoryCache
+from content_store import source_stamp
+from english_master import EnglishMasterIndex
+
+
+class MemorySheet:
+    """
+    A sheet of values kept in memory, that can be read like the sheets of the reader
+    backends
+    """
+
+    def __init__(self, title, rows):
+        self.title = title
+        self.rows = rows
+
+    def iter_rows(self, min_row=1, max_col=None, values_only=True):
+        for row in self.rows[min_row - 1 :]:
+            if max_col is not None:
+                row = tuple(row[:max_col]) + (None,) * (max_col - len(row))
+            yield row
+
+
+class MemoryWorkbook:
+    def __init__(self, sheets):
+        self.sheets = {
+            title: MemorySheet(title, rows) for title, rows in sheets.items()
+        }
+
+    @property
+    def sheetnames(self):
+        return list(self.sheets)
+
+    def __iter__(self):
+        return iter(self.sheets.values())
+
+    def __getitem__(self, title):
+        if title not in self.sheets:
+            raise KeyError(f"Worksheet {title} does not exist.")
+        return self.sheets[title]
+
+
+class ContentWatcher:
+    """
+    Keeps the values of every sheet of the workbook `filename`, before and after the
+    process_sheet.py rules are applied, the English master index, the parsed content,
+    and the media, in memory, so that each rebuild only processes and converts the
+    sheets that changed, and only rewrites the content_*.json files that they're
+    imported to.
+
+    If the English master index changes, the sheets that use it are processed again,
+    and rows that haven't changed are taken from an in memory build cache. The JSON
+    files aren't written while there are errors in the content, the same as
+    process_sheet.py doesn't save them, but are written on the first rebuild without
+    errors. Files that it wrote for Turn numbers that are taken out of ImportInfo are
+    removed.
+    """
+
+    def __init__(self, filename, reader=None, media=None, compact=False, output="."):
+        self.filename = filename.rstrip(os.sep)
+        self.reader = reader
+        self.media = media or {}
+        self.compact = compact
+        self.output = output
+        # The source and processed values of each sheet, including the header
+        self.sources = {}
+        self.processed = {}
+        # The stamp of each CSV file that the source values were read from
+        self.stamps = {}
+        self.errors = {}
+        self.english = None
+        self.rule_cache = MemoryCache()
+        self.parse_cache = MemoryCache()
+        # The cache keys that were used the last time each sheet was processed and
+        # parsed, which are the only ones kept between rebuilds
+        self.rule_keys = {}
+        self.parse_keys = {}
+        self.parsed = {}
+        self.import_info = None
+        # Sheets that changed since they were last processed, and sheets whose
+        # processed values changed since the JSON files were last written
+        self.pending = set()
+        self.dirty = set()
+        # The JSON files that have been written
+        self.files = set()
+
+    def read(self):
+        """
+        Reads the sheets that changed since the last read, and marks them to be
+        processed. The files of a CSV bundle are only read if they changed, a workbook
+        is read in full.
+        """
+        workbook = readers.open_workbook(self.filename, self.reader)
+        bundle = os.path.isdir(self.filename)
+        titles = set()
+        for sheet in workbook:
+            titles.add(sheet.title)
+            if bundle:
+                stamp = source_stamp(sheet.path)
+                if self.stamps.get(sheet.title) == stamp:
+                    continue
+                self.stamps[sheet.title] = stamp
+            rows = tuple(tuple(row) for row in sheet.iter_rows(values_only=True))
+            if self.sources.get(sheet.title) != rows:
+                self.sources[sheet.title] = rows
+                self.pending.add(sheet.title)
+        workbook.close()
+        for title in set(self.sources) - titles:
+            for values in (
+                self.sources,
+                self.processed,
+                self.stamps,
+                self.errors,
+                self.rule_keys,
+                self.parse_keys,
+                self.parsed,
+            ):
+                values.pop(title, None)
+            self.pending.discard(title)
+            self.dirty.add(title)
+
+    def clean(self, rules=process_sheet.RULES):
+        """
+        Applies the `rules` to the sheets that changed, and to the sheets that use the
+        English master if its index changed. Returns the titles of the sheets that were
+        processed.
+        """
+        cleaned = []
+        for title in sorted(
+            self.sources, key=lambda t: t != process_sheet.ENGLISH_MASTER
+        ):
+            if title not in self.pending:
+                continue
+            rows = self.sources[title]
+            sheet_rules, lookups = process_sheet.get_sheet_rules(
+                MemorySheet(title, rows), rules
+            )
+            errors = []
+            self.rule_cache.used = set()
+            if sheet_rules and rows:
+                if lookups and self.english is None:
+                    raise KeyError(
+                        f"Worksheet {process_sheet.ENGLISH_MASTER} does not exist."
+                    )
+                values = process_sheet.process_rows(
+                    process_sheet.ColumnMap(rows[0], title),
+                    (list(row) for row in rows[1:]),
+                    sheet_rules,
+                    self.english,
+                    errors.append,
+                    self.rule_cache,
+                )
+                processed = (rows[0],) + tuple(tuple(row) for row in values)
+            else:
+                processed = rows
+            self.errors[title] = errors
+            self.rule_keys[title] = self.rule_cache.used
+            if self.processed.get(title) != processed:
+                self.processed[title] = processed
+                self.parsed.pop(title, None)
+                self.dirty.add(title)
+            self.pending.discard(title)
+            cleaned.append(title)
+
+            if title == process_sheet.ENGLISH_MASTER and processed:
+                english = EnglishMasterIndex.from_rows(
+                    process_sheet.ColumnMap(processed[0], title), processed[1:]
+                )
+                if self.english is None or vars(english) != vars(self.english):
+                    for sheet in MemoryWorkbook(self.sources):
+                        _, lookups = process_sheet.get_sheet_rules(sheet, rules)
+                        if lookups and sheet.title != title:
+                            self.pending.add(sheet.title)
+                self.english = english
+        return cleaned
+
+    def outputs(self):
+        """
+        Returns the Turn numbers that each content_*.json file has, by filename
+        """
+        outputs = {}
+        for values in self.import_info[0].values():
+            name = f"content_{values['country_name']}_{values['number_type']}.json"
+            outputs.setdefault(name.replace(" ", "_"), []).append(values)
+        return outputs
+
+    def convert(self):
+        """
+        Writes the content_*.json files that have sheets that changed since they were
+        last written, and returns their filenames
+        """
+        workbook = MemoryWorkbook(self.processed)
+        # ImportInfo has the replacements and languages of every file
+        import_info = (
+            self.import_info is None or convert_to_json.SHEETNAME in self.dirty
+        )
+        if import_info:
+            self.import_info = convert_to_json.get_import_info(workbook)
+        all_languages = self.import_info[1]
+        outputs = self.outputs()
+        # Remove the files of Turn numbers that were taken out of ImportInfo
+        for name in sorted(self.files - set(outputs)):
+            path = os.path.join(self.output, name)
+            if os.path.exists(path):
+                os.remove(path)
+                print(f"removed: {name}")
+            self.files.discard(name)
+        written = []
+        for name, numbers in outputs.items():
+            if not import_info and not any(
+                values["sheet_name"] in self.dirty for values in numbers
+            ):
+                continue
+            writer = convert_to_json.ContentWriter(
+                os.path.join(self.output, name), self.compact
+            )
+            try:
+                for values in numbers:
+                    sheet_name = values["sheet_name"]
+                    if sheet_name not in self.parsed:
+                        self.parse_cache.used = set()
+                        self.parsed[sheet_name] = convert_to_json.parse_sheet(
+                            workbook[sheet_name], self.parse_cache
+                        )
+                        self.parse_keys[sheet_name] = self.parse_cache.used
+                    for entry in convert_to_json.get_entries(
+                        self.parsed[sheet_name],
+                        values,
+                        all_languages[values["country_name"]],
+                        self.media,
+                    ):
+                        writer.write(entry)
+            except BaseException:
+                writer.discard()
+                raise
+            writer.close()
+            self.files.add(name)
+            written.append(name)
+        self.dirty = set()
+        return written
+
+    def prune(self):
+        """
+        Removes the cached results that the latest processing and parsing of each
+        sheet didn't use, so that the caches don't grow with every edit
+        """
+        self.rule_cache.prune(set().union(*self.rule_keys.values()))
+        self.parse_cache.prune(set().union(*self.parse_keys.values()))
+
+    def rebuild(self):
+        """
+        Reads, processes and converts the sheets that changed, and prints what was
+        rebuilt, and how long it took
+        """
+        start = time.perf_counter()
+        self.read()
+        cleaned = self.clean()
+        for title in cleaned:
+            for content_error in self.errors[title]:
+                print(content_error.message)
+        errors = sum(len(errors) for errors in self.errors.values())
+        written = []
+        if not errors:
+            written = self.convert()
+        self.prune()
+        duration = (time.perf_counter() - start) * 1000
+        message = f"rebuilt in {duration:.0f}ms: processed {len(cleaned)} sheets"
+        if errors:
+            message += f", {errors} errors, not writing"
+        else:
+            message += f", wrote {len(written)} files"
+            if written:
+                message += f" ({', '.join(written)})"
+        print(f"{time.strftime('%H:%M:%S')} {message}")
+        return written
+
+    def watch(self, interval=0.25):
+        """
+        Rebuilds whenever the workbook, or any file of the CSV bundle, changes. A
+        change is only rebuilt once it hasn't changed for `interval` seconds, so that
+        files that are still being saved aren't read.
+        """
+        built = None
+        seen = None
+        while True:
+            try:
+                stamp = source_stamp(self.filename)
+            except FileNotFoundError:
+                stamp = None
+            if stamp is not None and stamp == seen and stamp != built:
+                built = stamp
+                try:
+                    self.rebuild()
+                except Exception as e:
+                    print(f"{time.strftime('%H:%M:%S')} rebuild failed: {e!r}")
+            seen = stamp
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Processes and converts the content whenever it changes, to the "
+        "same content_*.json files as process_sheet.py and convert_to_json.py, keeping "
+        "everything in memory between changes"
+    )
+    parser.add_argument(
+        "--input",
+        default=convert_to_json.FILENAME,
+        help="The workbook to watch, or a directory with a CSV file for each sheet",
+    )
+    parser.add_argument(
+        "--reader",
+        choices=["xlsx", "openpyxl"],
+        default=None,
+        help="How to read the workbook, xlsx by default. A directory is always read as "
+        "a CSV bundle",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Write the JSON files without indentation, to make them smaller",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only use the saved snapshot of the media, instead of doing an export",
+    )
+    parser.add_argument(
+        "--media-ttl",
+        type=int,
+        default=turn_export.CACHE_TTL,
+        help="Seconds to use the saved media snapshot for without checking Turn for "
+        "changes. By default, changes are checked for every time",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.25,
+        help="Seconds between checks for changes",
+    )
+    args = parser.parse_args()
+
+    media = convert_to_json.get_media(args.offline, args.media_ttl)
+    watcher = ContentWatcher(args.input, args.reader, media, args.compact)
+    print(f"watching: {args.input}")
+    try:
+        watcher.watch(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()